@@ -3,11 +3,13 @@ import json
 import os
 from datetime import datetime
 import uuid
-import numpy as np
+import math
+from Libraries.result_codec import ResultCodec
+from Libraries.document_session import DocumentSessionCache
 
 class NaNEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, float) and np.isnan(obj):
+        if isinstance(obj, float) and math.isnan(obj):
             return None
         return super().default(obj)
 
@@ -51,15 +53,27 @@ class DBManager:
         pdf_id = str(uuid.uuid4())
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            # Use custom encoder to handle NaN values
-            metadata_json = json.dumps(metadata, cls=NaNEncoder)
+            # Store results in the compressed binary format; custom encoder handles NaN values
+            metadata_blob = ResultCodec.encode(metadata, json_encoder=NaNEncoder)
             cursor.execute(
                 'INSERT INTO pdfs (id, name, timestamp, file_path, metadata, is_indexed) VALUES (?, ?, ?, ?, ?, ?)',
-                (pdf_id, name, datetime.now().isoformat(), file_path, metadata_json, False)
+                (pdf_id, name, datetime.now().isoformat(), file_path, sqlite3.Binary(metadata_blob), False)
             )
             conn.commit()
         return pdf_id
 
+    @staticmethod
+    def _row_to_item(row):
+        """Convert a pdfs row into a dictionary; the result's pages are decoded on access."""
+        return {
+            'id': row[0],
+            'name': row[1],
+            'timestamp': row[2],
+            'file_path': row[3],
+            'result': ResultCodec.decode(row[4]),
+            'is_indexed': bool(row[5]) if len(row) > 5 else False
+        }
+
     def get_history(self):
         """Get all PDF history."""
         try:
@@ -71,14 +85,7 @@ class DBManager:
                 if not rows:
                     return []
                     
-                return [{
-                    'id': row[0],
-                    'name': row[1],
-                    'timestamp': row[2],
-                    'file_path': row[3],
-                    'result': json.loads(row[4]) if row[4] else {},
-                    'is_indexed': bool(row[5]) if len(row) > 5 else False
-                } for row in rows]
+                return [self._row_to_item(row) for row in rows]
                 
         except sqlite3.Error as e:
             print(f"Database error in get_history: {str(e)}")
@@ -90,8 +97,24 @@ class DBManager:
             print(f"Unexpected error in get_history: {str(e)}")
             raise
 
+    def get_pdf(self, pdf_id: str):
+        """Get a single PDF record in the same shape as get_history entries, or None."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM pdfs WHERE id = ?', (pdf_id,))
+            row = cursor.fetchone()
+            return self._row_to_item(row) if row else None
+
+    def get_result(self, pdf_id: str):
+        """Get the stored extraction result for a PDF; pages are decoded on access."""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT metadata FROM pdfs WHERE id = ?', (pdf_id,))
+            row = cursor.fetchone()
+            return ResultCodec.decode(row[0]) if row else None
+
     def remove_pdf(self, pdf_id):
-        """Remove PDF from database and file system."""
+        """Remove PDF from database and file system. Returns False if the id is unknown."""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT file_path FROM pdfs WHERE id = ?', (pdf_id,))
@@ -99,9 +122,11 @@ class DBManager:
             if row:
                 file_path = row[0]
                 if os.path.exists(file_path):
+                    DocumentSessionCache.get_shared().discard(file_path)
                     os.remove(file_path)
                 cursor.execute('DELETE FROM pdfs WHERE id = ?', (pdf_id,))
                 conn.commit()
+            return row is not None
 
     def clear_history(self):
         """Clear all history and remove PDF files."""
@@ -112,6 +137,7 @@ class DBManager:
             for row in rows:
                 file_path = row[0]
                 if os.path.exists(file_path):
+                    DocumentSessionCache.get_shared().discard(file_path)
                     os.remove(file_path)
             cursor.execute('DELETE FROM pdfs')
             conn.commit()
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import fitz  # PyMuPDF
+
+class DocumentSession:
+    """A parsed PDF shared by every caller that opens the same file contents.
+
+    PyMuPDF shares one MuPDF context across all documents and does not support
+    concurrent calls from several threads, even on different documents. Every
+    PyMuPDF call in the process is therefore made while holding ``FITZ_LOCK``.
+    Hold it only around the calls themselves, including dropping the pages and
+    pixmaps they return, and clean, encode or parse their copied-out results
+    after releasing it.
+    """
+
+    FITZ_LOCK = threading.RLock()
+
+    def __init__(self, file_hash: str, data: bytes):
+        self.file_hash = file_hash
+        with self.FITZ_LOCK:
+            self.doc = fitz.open(stream=data, filetype="pdf")
+        self.users = 0
+        self.evicted = False
+
+    @property
+    def lock(self) -> threading.RLock:
+        """The process-wide PyMuPDF lock, held while using this document."""
+        return DocumentSession.FITZ_LOCK
+
+    def close(self):
+        try:
+            self.doc.close()
+        except Exception as e:
+            print(f"Error closing document session: {e}")
+
+class DocumentSessionCache:
+    """Bounded LRU of open PDF documents keyed by the SHA-256 of their contents.
+
+    Keying by contents means a file that is validated in ``uploads``, moved to
+    ``storage`` and later rendered or indexed is parsed only once. File hashes
+    are remembered per (device, inode, size, mtime), which a rename preserves,
+    so repeat opens skip reading the file as well.
+    """
+
+    _shared: Optional["DocumentSessionCache"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_documents: int = 8, max_hashes: int = 256):
+        self.max_documents = max_documents
+        self.max_hashes = max_hashes
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self._hashes: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+
+    @classmethod
+    def get_shared(cls) -> "DocumentSessionCache":
+        """Get the process-wide cache, creating it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(max_documents=int(os.environ.get("DOCUMENT_SESSION_MAX", 8)))
+            return cls._shared
+
+    @staticmethod
+    def _file_key(stat: os.stat_result) -> Tuple[int, int, int, int]:
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _remember_hash(self, key: Tuple[int, int, int, int], file_hash: str):
+        with self._lock:
+            self._hashes[key] = file_hash
+            self._hashes.move_to_end(key)
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+
+    def _acquire(self, path: str) -> DocumentSession:
+        """Find or create the session for a file and register the caller as a user."""
+        key = self._file_key(os.stat(path))
+        data = None
+        with self._lock:
+            file_hash = self._hashes.get(key)
+
+        if file_hash is None:
+            with open(path, "rb") as f:
+                data = f.read()
+            file_hash = hashlib.sha256(data).hexdigest()
+            self._remember_hash(key, file_hash)
+
+        with self._lock:
+            session = self._sessions.get(file_hash)
+            if session is not None:
+                self._sessions.move_to_end(file_hash)
+                session.users += 1
+                return session
+
+        # Parse outside the cache lock; another thread may race us to the same file
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        new_session = DocumentSession(file_hash, data)
+
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(file_hash)
+            if session is None:
+                session = new_session
+                self._sessions[file_hash] = session
+                while len(self._sessions) > self.max_documents:
+                    _, old = self._sessions.popitem(last=False)
+                    old.evicted = True
+                    if old.users == 0:
+                        evicted.append(old)
+            else:
+                self._sessions.move_to_end(file_hash)
+                evicted.append(new_session)
+            session.users += 1
+
+        for old in evicted:
+            with old.lock:
+                old.close()
+        return session
+
+    def _release(self, session: DocumentSession):
+        """Unregister a user, closing the document if it was evicted meanwhile."""
+        with self._lock:
+            session.users -= 1
+            close = session.evicted and session.users == 0
+        if close:
+            with session.lock:
+                session.close()
+
+    def discard(self, path: str):
+        """Drop the session of a file that is about to be deleted.
+
+        Call this before removing a file so its parsed document does not stay
+        in the cache until it is evicted. A document still in use is closed
+        once its last user releases it.
+        """
+        try:
+            key = self._file_key(os.stat(path))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            file_hash = self._hashes.pop(key, None)
+            session = self._sessions.pop(file_hash, None) if file_hash else None
+            if session is None:
+                return
+            session.evicted = True
+            close = session.users == 0
+        if close:
+            with session.lock:
+                session.close()
+
+    @contextmanager
+    def open(self, path: str):
+        """Yield the shared open document for a PDF file.
+
+        The document stays open until the block exits, but it is not locked:
+        wrap each PyMuPDF call in ``DocumentSession.FITZ_LOCK`` and process the
+        results after releasing it (see ``DocumentSession``).
+
+        Raises whatever ``fitz.open`` raises for unreadable or corrupt files.
+        """
+        session = self._acquire(path)
+        try:
+            yield session.doc
+        finally:
+            self._release(session)
+
+    def clear(self):
+        """Close every document that is not in use and forget all sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._hashes.clear()
+            for session in sessions:
+                session.evicted = True
+            idle = [session for session in sessions if session.users == 0]
+        for session in idle:
+            with session.lock:
+                session.close()
+
+    @classmethod
+    def _reset_shared_after_fork(cls):
+        # Locks may have been held by other threads at fork time; start clean
+        cls._shared_lock = threading.Lock()
+        DocumentSession.FITZ_LOCK = threading.RLock()
+        if cls._shared is not None:
+            cls._shared._lock = threading.Lock()
+            cls._shared._sessions = OrderedDict()
+            cls._shared._hashes = OrderedDict()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=DocumentSessionCache._reset_shared_after_fork)
@@ -0,0 +1,210 @@
+import base64
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from PIL import Image, ImageStat
+
+class ImagePipeline:
+    """Filter, downscale and encode images extracted from a PDF.
+
+    Every kept image gets a web-sized variant in ``data`` and its ``xref``.
+    Images that were downscaled or re-encoded also carry an ``original`` entry
+    with the source type and dimensions; the original bytes themselves are not
+    inlined but served on demand from ``/pdf/<id>/image/<xref>``. Encoding runs
+    in a thread pool since Pillow releases the GIL while resampling and
+    compressing.
+    """
+
+    # Constructor argument -> (environment variable, type) for from_env
+    ENV_SETTINGS = {
+        'min_width': ('IMAGE_MIN_WIDTH', int),
+        'min_height': ('IMAGE_MIN_HEIGHT', int),
+        'min_bytes': ('IMAGE_MIN_BYTES', int),
+        'max_aspect_ratio': ('IMAGE_MAX_ASPECT_RATIO', float),
+        'decorative_stddev': ('IMAGE_DECORATIVE_STDDEV', float),
+        'web_max_dimension': ('IMAGE_WEB_MAX_DIMENSION', int),
+        'web_quality': ('IMAGE_WEB_QUALITY', int),
+        'byte_budget': ('IMAGE_BYTE_BUDGET', int),
+        'max_workers': ('IMAGE_WORKERS', int),
+    }
+
+    def __init__(
+        self,
+        min_width: int = 32,
+        min_height: int = 32,
+        min_bytes: int = 256,
+        max_aspect_ratio: float = 25.0,
+        decorative_stddev: float = 4.0,
+        web_max_dimension: int = 1024,
+        web_quality: int = 80,
+        byte_budget: int = 8 * 1024 * 1024,
+        max_workers: int = 4
+    ):
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_bytes = min_bytes
+        self.max_aspect_ratio = max_aspect_ratio
+        self.decorative_stddev = decorative_stddev
+        self.web_max_dimension = web_max_dimension
+        self.web_quality = web_quality
+        self.byte_budget = byte_budget
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, environ=None) -> "ImagePipeline":
+        """Create a pipeline with settings overridden by IMAGE_* environment variables."""
+        environ = os.environ if environ is None else environ
+        settings = {}
+        for name, (variable, cast) in cls.ENV_SETTINGS.items():
+            if environ.get(variable):
+                settings[name] = cast(environ[variable])
+        return cls(**settings)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the shared encoding pool on first use."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image-encode")
+            return self._executor
+
+    @staticmethod
+    def to_data_uri(data: bytes, ext: str) -> str:
+        """Encode image bytes as a base64 data URI."""
+        return f'data:image/{ext};base64,{base64.b64encode(data).decode("utf-8")}'
+
+    @staticmethod
+    def data_uri_size(data: bytes) -> int:
+        """Size in bytes of the base64 data URI for a payload."""
+        return (len(data) + 2) // 3 * 4
+
+    def passes_dimension_filter(self, width: int, height: int) -> bool:
+        """Check the dimensions reported by the PDF, before the image is even extracted."""
+        width = width or 0
+        height = height or 0
+        if width < self.min_width or height < self.min_height:
+            return False
+        aspect = max(width, height) / max(min(width, height), 1)
+        return aspect <= self.max_aspect_ratio
+
+    def passes_size_filter(self, raw: Dict[str, Any]) -> bool:
+        """Cheap pre-decode check on the dimensions reported by the PDF and the payload size."""
+        if len(raw['image']) < self.min_bytes:
+            return False
+        return self.passes_dimension_filter(raw.get('width'), raw.get('height'))
+
+    def is_decorative(self, img: Image.Image) -> bool:
+        """Detect near-uniform images such as spacers, rules and solid backgrounds."""
+        sample = img.convert('L')
+        sample.thumbnail((64, 64))
+        return ImageStat.Stat(sample).stddev[0] < self.decorative_stddev
+
+    def _encode_web_variant(self, img: Image.Image):
+        """Downscale an image and encode it for display in the browser."""
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        if max(img.size) > self.web_max_dimension:
+            img.thumbnail((self.web_max_dimension, self.web_max_dimension), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        if has_alpha:
+            img.save(buffer, format='PNG', optimize=True)
+            ext = 'png'
+        else:
+            img.save(buffer, format='JPEG', quality=self.web_quality, optimize=True)
+            ext = 'jpeg'
+        return buffer.getvalue(), ext, img.size
+
+    def _process_one(self, raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Decode, filter and encode a single image. Returns None if it is dropped."""
+        try:
+            with Image.open(io.BytesIO(raw['image'])) as img:
+                img.load()
+                if self.is_decorative(img):
+                    return None
+                width, height = img.size
+                web_data, web_ext, web_size = self._encode_web_variant(img)
+
+            # Keep the original when re-encoding would not make it smaller
+            if len(web_data) >= len(raw['image']) and raw['ext'] in ('png', 'jpeg', 'jpg', 'gif', 'webp'):
+                web_data, web_ext, web_size = raw['image'], raw['ext'], (width, height)
+
+            return {
+                'web': (web_data, web_ext, web_size),
+                'original': (raw['ext'], (width, height)) if web_data is not raw['image'] else None,
+            }
+        except Exception as e:
+            print(f"Error processing image {raw.get('xref')}: {str(e)}")
+            return None
+
+    def process(self, raw_images: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Process raw images from ``fitz.Document.extract_image``, in page order.
+
+        The first occurrence of an xref needs ``image``, ``ext``, ``width``,
+        ``height`` and ``xref``; later occurrences of the same xref only need
+        ``xref``. Returns one entry per input, in order: an output image dict,
+        or None when the image was filtered out or the byte budget ran out.
+
+        Images are encoded a few at a time ahead of the one being placed, and
+        encoding stops at the first image that does not fit the budget, so
+        extraction time is bounded by the budget as well as the response size.
+        """
+        candidates = {}
+        for raw in raw_images:
+            if raw['xref'] not in candidates and 'image' in raw and self.passes_size_filter(raw):
+                candidates[raw['xref']] = raw
+
+        # Images repeated across pages (logos, headers) are encoded only once
+        executor = self._get_executor()
+        queue = iter(candidates.values())
+        futures = {}
+        encoded = {}
+
+        def submit_ahead():
+            while len(futures) < self.max_workers * 2:
+                raw = next(queue, None)
+                if raw is None:
+                    return
+                futures[raw['xref']] = executor.submit(self._process_one, raw)
+
+        remaining = self.byte_budget
+        exhausted = False
+        outputs: List[Optional[Dict[str, Any]]] = []
+        for raw in raw_images:
+            xref = raw['xref']
+            if exhausted or xref not in candidates:
+                outputs.append(None)
+                continue
+            if xref not in encoded:
+                # Candidates are queued in order of first occurrence, so this one is next
+                submit_ahead()
+                encoded[xref] = futures.pop(xref).result()
+            item = encoded[xref]
+            if item is None:
+                outputs.append(None)
+                continue
+            web_data, web_ext, (width, height) = item['web']
+            cost = self.data_uri_size(web_data)
+            if cost > remaining:
+                exhausted = True
+                for future in futures.values():
+                    future.cancel()
+                outputs.append(None)
+                continue
+            remaining -= cost
+            output = {
+                'data': self.to_data_uri(web_data, web_ext),
+                'type': web_ext,
+                'width': width,
+                'height': height,
+                'xref': raw['xref'],
+            }
+            if item['original'] is not None:
+                orig_ext, (orig_width, orig_height) = item['original']
+                output['original'] = {'type': orig_ext, 'width': orig_width, 'height': orig_height}
+            outputs.append(output)
+
+        return outputs
@@ -0,0 +1,351 @@
+import errno
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the registry is then unlocked
+    fcntl = None
+
+class ResidentIndex:
+    """Read-only view of a document index backed by memory-mapped files.
+
+    Embeddings, chunk offsets and chunk texts are mapped from files shared by
+    every worker on the host, so the operating system keeps a single copy in
+    the page cache no matter how many processes attach.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.identity = self._identity(path)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.nodes: List[Dict[str, Any]] = json.load(f)["nodes"]
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._texts = self._map_file(os.path.join(path, "texts.bin"))
+
+    @staticmethod
+    def _map_file(file_path: str):
+        """Map a file read-only; empty files cannot be mapped."""
+        if os.path.getsize(file_path) == 0:
+            return b""
+        with open(file_path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _identity(path: str):
+        """Inode plus change time, so a directory recreated with a reused inode is detected."""
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_ctime_ns
+
+    def is_current(self) -> bool:
+        """Check that the files were not evicted or replaced since attaching."""
+        try:
+            return self._identity(self.path) == self.identity
+        except FileNotFoundError:
+            return False
+
+    def get_text(self, position: int) -> str:
+        """Decode the text of one chunk from the shared text blob."""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return bytes(self._texts[start:end]).decode("utf-8")
+
+    def retrieve(self, query_embedding: List[float], top_k: int = 2):
+        """Return the top_k chunks by cosine similarity as llama-index NodeWithScore objects."""
+        from llama_index.core.schema import NodeWithScore, TextNode
+
+        if len(self.nodes) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self.embeddings @ query
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        results = []
+        for position in best:
+            node = self.nodes[position]
+            results.append(NodeWithScore(
+                node=TextNode(
+                    id_=node["id"],
+                    text=self.get_text(position),
+                    metadata=node["metadata"],
+                    excluded_embed_metadata_keys=node["excluded_embed_metadata_keys"],
+                    excluded_llm_metadata_keys=node["excluded_llm_metadata_keys"]
+                ),
+                score=float(scores[position])
+            ))
+        return results
+
+class SharedIndexStore:
+    """Host-wide cache of document indices held in shared memory.
+
+    The first worker to query a document converts its persisted llama-index
+    storage into flat files under ``root`` (``/dev/shm`` when available); every
+    worker then maps those files read-only. A registry guarded by a file lock
+    tracks size and last access across processes and evicts the least recently
+    used documents to stay within ``max_bytes`` and the free space of the file
+    system, making room before a new document is written. Documents that still
+    do not fit (e.g. a small Docker ``/dev/shm``) go to ``fallback_root`` on
+    disk instead.
+
+    Each worker keeps at most ``max_attached`` documents mapped and drops
+    mappings that were evicted, replaced or left idle for ``ATTACH_IDLE_SECONDS``
+    on every lookup, so deleted files do not stay pinned in memory. A mapping
+    is released once the last query using it finishes.
+    """
+
+    REGISTRY_FILE = "registry.json"
+    LOCK_FILE = "registry.lock"
+    TOUCH_INTERVAL = 30.0  # Seconds between last-access updates per document and process
+    ATTACH_IDLE_SECONDS = 300.0  # Unused mappings are dropped after this long
+    RESERVE_FRACTION = 0.1  # Share of the file system left free for other users
+    DISK_ROOT = os.path.join("storage", "index_cache")
+
+    _shared: Optional["SharedIndexStore"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        fallback_root: Optional[str] = None,
+        max_attached: int = 16
+    ):
+        self.root = root or self.default_root()
+        self.max_bytes = max_bytes
+        self.max_attached = max_attached
+        self.fallback: Optional["SharedIndexStore"] = None
+        if fallback_root and os.path.abspath(fallback_root) != os.path.abspath(self.root):
+            self.fallback = SharedIndexStore(fallback_root, max_bytes, max_attached=max_attached)
+        # doc_id -> (resident index, last use); most recently used last
+        self._attached: "OrderedDict[str, Tuple[ResidentIndex, float]]" = OrderedDict()
+        self._last_touch: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def get_shared(cls) -> "SharedIndexStore":
+        """Get the process-wide store, creating it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    root=os.environ.get("INDEX_CACHE_DIR"),
+                    max_bytes=int(os.environ.get("INDEX_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+                    fallback_root=cls.DISK_ROOT
+                )
+            return cls._shared
+
+    @classmethod
+    def default_root(cls) -> str:
+        """Prefer tmpfs so the files never touch disk; fall back to local storage."""
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return os.path.join("/dev/shm", "pdfextractor-indices")
+        return cls.DISK_ROOT
+
+    def _doc_path(self, doc_id: str) -> str:
+        return os.path.join(self.root, doc_id)
+
+    @contextmanager
+    def _registry(self):
+        """Lock the registry across processes and yield it for reading and updating."""
+        with open(os.path.join(self.root, self.LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                registry_path = os.path.join(self.root, self.REGISTRY_FILE)
+                try:
+                    with open(registry_path, "r", encoding="utf-8") as f:
+                        registry = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    registry = {}
+                yield registry
+
+                temp_path = f"{registry_path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(registry, f)
+                os.replace(temp_path, registry_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _export(persist_dir: str, target: str) -> int:
+        """Convert a persisted llama-index index into flat mappable files. Returns bytes written."""
+        from llama_index.core import StorageContext
+
+        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        embedding_dict = storage_context.vector_store.data.embedding_dict
+
+        nodes, embeddings, offsets, texts = [], [], [0], bytearray()
+        for node_id, embedding in embedding_dict.items():
+            node = storage_context.docstore.get_node(node_id, raise_error=False)
+            if node is None:
+                continue
+            encoded = node.get_content().encode("utf-8")
+            texts.extend(encoded)
+            offsets.append(len(texts))
+            embeddings.append(embedding)
+            nodes.append({
+                "id": node_id,
+                "metadata": node.metadata,
+                "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+                "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+            })
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        os.makedirs(target)
+        np.save(os.path.join(target, "embeddings.npy"), matrix)
+        np.save(os.path.join(target, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(target, "texts.bin"), "wb") as f:
+            f.write(texts)
+        with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"nodes": nodes}, f)
+        return SharedIndexStore._dir_size(target)
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    def _budget(self, registry: Dict[str, Any]) -> int:
+        """Bytes the store may use: max_bytes, capped by what the file system can hold."""
+        stat = os.statvfs(self.root)
+        used = sum(entry["bytes"] for entry in registry.values())
+        reserve = stat.f_blocks * stat.f_frsize * self.RESERVE_FRACTION
+        capacity = used + stat.f_bavail * stat.f_frsize - reserve
+        return int(max(0, min(self.max_bytes, capacity)))
+
+    def _evict(self, registry: Dict[str, Any], keep: Optional[str] = None, incoming: int = 0):
+        """Remove least recently used documents until the store plus ``incoming`` bytes fits its budget."""
+        budget = self._budget(registry) - incoming
+        total = sum(entry["bytes"] for entry in registry.values())
+        evictable = sum(entry["bytes"] for doc_id, entry in registry.items() if doc_id != keep)
+        if total - evictable > budget:
+            return False  # Evicting everything would not make room; keep what is cached
+        for doc_id, entry in sorted(registry.items(), key=lambda item: item[1]["last_access"]):
+            if total <= budget:
+                break
+            if doc_id == keep:
+                continue
+            shutil.rmtree(self._doc_path(doc_id), ignore_errors=True)
+            del registry[doc_id]
+            total -= entry["bytes"]
+        return total <= budget
+
+    def materialize(self, doc_id: str, persist_dir: str) -> "SharedIndexStore":
+        """Make sure a shared copy of a document's index exists. Returns the store holding it."""
+        if os.path.isdir(self._doc_path(doc_id)):
+            return self
+        if self.fallback is not None and os.path.isdir(self.fallback._doc_path(doc_id)):
+            return self.fallback
+
+        try:
+            return self._materialize_here(doc_id, persist_dir)
+        except OSError as e:
+            if e.errno != errno.ENOSPC or self.fallback is None:
+                raise
+            print(f"Shared index cache {self.root} is full; using {self.fallback.root} for {doc_id}")
+            return self.fallback.materialize(doc_id, persist_dir)
+
+    def _materialize_here(self, doc_id: str, persist_dir: str) -> "SharedIndexStore":
+        target = self._doc_path(doc_id)
+        # Make room before writing. The persisted JSON is larger than the flat
+        # files, so when even that does not fit, try anyway and rely on ENOSPC.
+        estimate = self._dir_size(persist_dir)
+        with self._registry() as registry:
+            self._evict(registry, incoming=estimate)
+
+        # Export outside the lock so other documents are not blocked meanwhile
+        temp_target = os.path.join(self.root, f".{doc_id}.{uuid.uuid4().hex}.tmp")
+        try:
+            size = self._export(persist_dir, temp_target)
+            with self._registry() as registry:
+                if os.path.isdir(target):
+                    return self  # Another worker finished first
+                os.rename(temp_target, target)
+                registry[doc_id] = {"bytes": size, "last_access": time.time()}
+                self._evict(registry, keep=doc_id)
+            return self
+        finally:
+            shutil.rmtree(temp_target, ignore_errors=True)
+
+    def _touch(self, doc_id: str):
+        """Record an access in the registry, at most once per interval per process."""
+        now = time.time()
+        if now - self._last_touch.get(doc_id, 0) < self.TOUCH_INTERVAL:
+            return
+        self._last_touch[doc_id] = now
+        with self._registry() as registry:
+            if doc_id in registry:
+                registry[doc_id]["last_access"] = now
+
+    def _sweep(self):
+        """Drop mappings that are stale, idle or beyond max_attached.
+
+        Dropped indices are only unreferenced here; their files stay mapped
+        until queries still using them finish.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for doc_id, (resident, last_use) in list(self._attached.items()):
+                if now - last_use > self.ATTACH_IDLE_SECONDS or not resident.is_current():
+                    del self._attached[doc_id]
+                    self._last_touch.pop(doc_id, None)
+            while len(self._attached) > self.max_attached:
+                doc_id, _ = self._attached.popitem(last=False)
+                self._last_touch.pop(doc_id, None)
+
+    def get(self, doc_id: str, persist_dir: str) -> ResidentIndex:
+        """Attach to the shared copy of a document's index, creating it if needed."""
+        self._sweep()
+        with self._lock:
+            attached = self._attached.get(doc_id)
+            resident = attached[0] if attached else None
+
+        if resident is None:
+            for _ in range(3):
+                store = self.materialize(doc_id, persist_dir)
+                try:
+                    resident = ResidentIndex(store._doc_path(doc_id))
+                    break
+                except FileNotFoundError:
+                    continue  # Evicted between materializing and attaching; try again
+            else:
+                raise RuntimeError(f"Could not attach index for document {doc_id}")
+
+        with self._lock:
+            self._attached[doc_id] = (resident, time.monotonic())
+            self._attached.move_to_end(doc_id)
+
+        if os.path.dirname(resident.path) == self.root:
+            self._touch(doc_id)
+        elif self.fallback is not None:
+            self.fallback._touch(doc_id)
+        return resident
+
+    def invalidate(self, doc_id: str):
+        """Drop the shared copy of a document, e.g. after it was re-indexed or removed."""
+        try:
+            with self._registry() as registry:
+                registry.pop(doc_id, None)
+                shutil.rmtree(self._doc_path(doc_id), ignore_errors=True)
+            with self._lock:
+                self._attached.pop(doc_id, None)
+            if self.fallback is not None:
+                self.fallback.invalidate(doc_id)
+        except Exception as e:
+            print(f"Error invalidating shared index: {e}")
@@ -0,0 +1,260 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from Libraries.pdf_processor import PDFProcessor
+from Libraries.document_session import DocumentSession
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character estimate
+    _ENCODING = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, otherwise estimate them."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+class LayoutChunker:
+    """Split a PDF into semantic chunks using the layout PyMuPDF reports.
+
+    Blocks are classified as headings (by font size or bold, short text),
+    tables, equations or paragraphs. Paragraphs are grouped under their section
+    heading up to ``max_tokens``; tables and equations are never split, and a
+    heading always starts a new chunk. Each chunk records its section path in
+    metadata, which is embedded with the chunk but kept out of LLM prompts.
+    """
+
+    BOLD_FLAG = 16
+
+    def __init__(
+        self,
+        max_tokens: int = 512,
+        heading_size_ratio: float = 1.15,
+        max_heading_chars: int = 200,
+        detect_tables: bool = True
+    ):
+        self.max_tokens = max_tokens
+        self.heading_size_ratio = heading_size_ratio
+        self.max_heading_chars = max_heading_chars
+        self.detect_tables = detect_tables
+
+    @staticmethod
+    def _block_text(block: Dict[str, Any]) -> str:
+        """Join a text block's spans the way PDFProcessor.extract_text_from_page does."""
+        lines = []
+        for line in block["lines"]:
+            line_text = []
+            for span in line["spans"]:
+                if span.get("space_before", 0) > 0:
+                    line_text.append(" ")
+                line_text.append(span["text"])
+            lines.append("".join(line_text))
+        return " ".join(lines).strip()
+
+    @staticmethod
+    def body_font_size(pages_dicts: List[Dict[str, Any]]) -> float:
+        """Most common font size weighted by character count."""
+        sizes = Counter()
+        for page_dict in pages_dicts:
+            for block in page_dict["blocks"]:
+                for line in block.get("lines", []):
+                    for span in line["spans"]:
+                        sizes[round(span["size"], 1)] += len(span["text"].strip())
+        return sizes.most_common(1)[0][0] if sizes else 0.0
+
+    @staticmethod
+    def _find_tables(page) -> List[Dict[str, Any]]:
+        """Detect tables with PyMuPDF's table finder, if this version has one."""
+        if not hasattr(page, "find_tables"):
+            return []
+        try:
+            tables = []
+            for table in page.find_tables().tables:
+                rows = [[(cell or "").strip() for cell in row] for row in table.extract()]
+                if len(rows) < 2:
+                    continue
+                text = "\n".join(" | ".join(row) for row in rows)
+                tables.append({"bbox": tuple(table.bbox), "text": text})
+            return tables
+        except Exception as e:
+            print(f"Error finding tables: {str(e)}")
+            return []
+
+    @staticmethod
+    def _inside(bbox, container) -> bool:
+        """Check whether the centre of a bbox lies within another bbox."""
+        x = (bbox[0] + bbox[2]) / 2
+        y = (bbox[1] + bbox[3]) / 2
+        return container[0] <= x <= container[2] and container[1] <= y <= container[3]
+
+    @staticmethod
+    def _dominant_size(block: Dict[str, Any]) -> float:
+        """Font size covering most characters of a block, so drop caps do not count."""
+        sizes = Counter()
+        for line in block["lines"]:
+            for span in line["spans"]:
+                sizes[round(span["size"], 1)] += len(span["text"].strip())
+        return sizes.most_common(1)[0][0] if sizes else 0.0
+
+    @staticmethod
+    def _is_horizontal(block: Dict[str, Any]) -> bool:
+        """Rotated text (margin stamps, axis labels) is not part of the reading flow."""
+        return any(abs(line.get("dir", (1, 0))[0]) > 0.99 for line in block["lines"])
+
+    def _is_heading(self, block: Dict[str, Any], text: str, body_size: float) -> bool:
+        """Short blocks set larger than body text, or entirely bold, are headings."""
+        if not text or len(text) > self.max_heading_chars or len(block["lines"]) > 3:
+            return False
+        if not re.search(r"[A-Za-z]", text):
+            return False
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            return False
+        size = self._dominant_size(block)
+        if body_size and size >= body_size * self.heading_size_ratio:
+            return True
+        all_bold = all(span.get("flags", 0) & self.BOLD_FLAG for span in spans)
+        return all_bold and not text.endswith(".") and size >= body_size
+
+    def read_pages(self, doc) -> List[Dict[str, Any]]:
+        """Copy each page's text layout and tables out of PyMuPDF, one page per lock hold."""
+        with DocumentSession.FITZ_LOCK:
+            page_count = len(doc)
+        pages = []
+        for page_num in range(page_count):
+            with DocumentSession.FITZ_LOCK:
+                page = doc[page_num]
+                pages.append({
+                    "number": page_num + 1,
+                    "dict": page.get_text("dict"),
+                    "tables": self._find_tables(page) if self.detect_tables else [],
+                })
+                del page
+        return pages
+
+    def extract_blocks(self, doc) -> List[Dict[str, Any]]:
+        """Classify every text block of a document into headings, paragraphs, tables and equations."""
+        pages = self.read_pages(doc)
+        body_size = self.body_font_size([page["dict"] for page in pages])
+
+        blocks = []
+        for page in pages:
+            page_num, page_dict, tables = page["number"], page["dict"], page["tables"]
+            emitted_tables = set()
+
+            for block in page_dict["blocks"]:
+                if "lines" not in block:
+                    continue
+                text = self._block_text(block)
+                if not text or not self._is_horizontal(block):
+                    continue
+
+                table_index = next(
+                    (i for i, table in enumerate(tables) if self._inside(block["bbox"], table["bbox"])),
+                    None
+                )
+                if table_index is not None:
+                    # Emit each table once, in place of the blocks it covers
+                    if table_index not in emitted_tables:
+                        emitted_tables.add(table_index)
+                        blocks.append({"kind": "table", "text": tables[table_index]["text"], "page": page_num})
+                    continue
+
+                if self._is_heading(block, text, body_size):
+                    blocks.append({
+                        "kind": "heading", "text": text, "page": page_num, "size": self._dominant_size(block)
+                    })
+                elif PDFProcessor.is_math_content(text):
+                    blocks.append({"kind": "equation", "text": text, "page": page_num})
+                else:
+                    blocks.append({"kind": "paragraph", "text": PDFProcessor.clean_text(text), "page": page_num})
+        return blocks
+
+    def _split_long_text(self, text: str) -> List[str]:
+        """Split an oversized paragraph at sentence boundaries."""
+        pieces, current = [], ""
+        for sentence in re.split(r"(?<=[.!?])\s+", text):
+            candidate = f"{current} {sentence}".strip()
+            if current and count_tokens(candidate) > self.max_tokens:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = candidate
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def chunk_blocks(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group classified blocks into chunks with text and metadata."""
+        chunks = []
+        headings: List[Dict[str, Any]] = []  # Stack of enclosing headings
+        current: Dict[str, Any] = {}
+
+        def section_path() -> str:
+            return " > ".join(heading["text"] for heading in headings)
+
+        def flush():
+            if current.get("parts"):
+                chunks.append({
+                    "text": "\n\n".join(current["parts"]),
+                    "metadata": {
+                        "section": current["section"],
+                        "page_start": current["page_start"],
+                        "page_end": current["page_end"],
+                        "kinds": ",".join(sorted(current["kinds"])),
+                    }
+                })
+            current.clear()
+
+        def add(text: str, kind: str, page: int):
+            if current and current["tokens"] + count_tokens(text) > self.max_tokens:
+                flush()
+            if not current:
+                current.update({
+                    "parts": [], "kinds": set(), "tokens": 0,
+                    "section": section_path(), "page_start": page, "page_end": page
+                })
+            current["parts"].append(text)
+            current["kinds"].add(kind)
+            current["tokens"] += count_tokens(text)
+            current["page_end"] = page
+
+        for block in blocks:
+            if block["kind"] == "heading":
+                flush()
+                # Pop headings of the same or a smaller size; they are siblings or children
+                while headings and headings[-1]["size"] <= block["size"] + 0.5:
+                    headings.pop()
+                headings.append(block)
+            elif block["kind"] == "paragraph" and count_tokens(block["text"]) > self.max_tokens:
+                for piece in self._split_long_text(block["text"]):
+                    add(piece, "paragraph", block["page"])
+            else:
+                # Tables and equations are kept whole even if they exceed max_tokens
+                add(block["text"], block["kind"], block["page"])
+        flush()
+        return chunks
+
+    def chunk_document(self, doc) -> List[Dict[str, Any]]:
+        """Chunk an open PyMuPDF document."""
+        return self.chunk_blocks(self.extract_blocks(doc))
+
+    def to_nodes(self, chunks: List[Dict[str, Any]], source: Optional[str] = None):
+        """Convert chunks into llama-index TextNodes."""
+        from llama_index.core.schema import TextNode
+
+        nodes = []
+        for chunk in chunks:
+            metadata = dict(chunk["metadata"])
+            if source:
+                metadata["file_name"] = source
+            nodes.append(TextNode(
+                text=chunk["text"],
+                metadata=metadata,
+                # The section path helps retrieval but is not repeated in every prompt
+                excluded_embed_metadata_keys=[key for key in metadata if key != "section"],
+                excluded_llm_metadata_keys=[key for key in metadata if key != "page_start"]
+            ))
+        return nodes
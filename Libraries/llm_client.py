@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import openai
+
+class LLMClientPool:
+    """Shared OpenAI clients keyed by API key, on one keep-alive connection pool.
+
+    Clients are created once per API key and reused across requests, so no
+    global OpenAI state is mutated. Every client of the process, including the
+    llama-index LLM and embedding wrappers, sends its requests through one
+    shared HTTP connection pool, so TCP/TLS connections are reused across keys
+    and requests.
+
+    Calls block the calling thread for the duration of the request, so under
+    gunicorn's gthread workers each in-flight LLM call occupies one worker
+    thread.
+    """
+
+    DEFAULT_MODEL = "gpt-3.5-turbo"
+    _shared: Optional["LLMClientPool"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+        max_keys: int = 64
+    ):
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._http_client: Optional[openai.DefaultHttpxClient] = None
+
+    @classmethod
+    def get_shared(cls) -> "LLMClientPool":
+        """Get the process-wide pool, creating it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(timeout=float(os.environ.get("LLM_TIMEOUT", 60)))
+            return cls._shared
+
+    @staticmethod
+    def _key(api_key: str) -> str:
+        """Hash API keys so they are not kept as dictionary keys in plain text."""
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def get_http_client(self) -> openai.DefaultHttpxClient:
+        """Get the connection pool shared by every client of this pool."""
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = openai.DefaultHttpxClient(timeout=self.timeout)
+            return self._http_client
+
+    def _get_entry(self, api_key: str) -> Dict[str, Any]:
+        """Get (or create) the per-key entry, evicting the least recently used key."""
+        if not api_key:
+            raise ValueError("OpenAI API key is required")
+        key = self._key(api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {}
+                self._entries[key] = entry
+                # Evicted clients hold no connections of their own, so they are simply dropped
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get_client(self, api_key: str) -> openai.OpenAI:
+        """Get the synchronous client for an API key."""
+        http_client = self.get_http_client()
+        entry = self._get_entry(api_key)
+        with self._lock:
+            if "client" not in entry:
+                entry["client"] = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    http_client=http_client
+                )
+            return entry["client"]
+
+    def get_llm(self, api_key: str, model: str = DEFAULT_MODEL):
+        """Get a cached llama-index OpenAI LLM for this key, sending through the shared pool."""
+        from llama_index.llms.openai import OpenAI
+
+        http_client = self.get_http_client()
+        entry = self._get_entry(api_key)
+        with self._lock:
+            cache_key = f"llm:{model}"
+            if cache_key not in entry:
+                entry[cache_key] = OpenAI(
+                    model=model,
+                    api_key=api_key,
+                    api_base=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    reuse_client=True,
+                    http_client=http_client
+                )
+            return entry[cache_key]
+
+    def get_embed_model(self, api_key: str):
+        """Get a cached llama-index OpenAI embedding model for this key, sending through the shared pool."""
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        http_client = self.get_http_client()
+        entry = self._get_entry(api_key)
+        with self._lock:
+            if "embed_model" not in entry:
+                entry["embed_model"] = OpenAIEmbedding(
+                    api_key=api_key,
+                    api_base=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries,
+                    reuse_client=True,
+                    http_client=http_client
+                )
+            return entry["embed_model"]
+
+    def chat(
+        self,
+        api_key: str,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        **kwargs
+    ) -> str:
+        """Send a chat completion request, blocking the calling thread until it completes."""
+        response = self.get_client(api_key).chat.completions.create(
+            model=model,
+            messages=messages,
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    def _reset_after_fork(self):
+        """Drop clients and the connection pool inherited from a parent process."""
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._http_client = None
+
+    @classmethod
+    def _reset_shared_after_fork(cls):
+        cls._shared_lock = threading.Lock()
+        if cls._shared is not None:
+            cls._shared._reset_after_fork()
+
+# Sockets do not survive fork (e.g. gunicorn workers)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=LLMClientPool._reset_shared_after_fork)
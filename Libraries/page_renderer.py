@@ -0,0 +1,234 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from Libraries.document_session import DocumentSession, DocumentSessionCache
+
+class PageRenderer:
+    """Render PDF pages to PNG images and keep them in a size-bounded disk cache."""
+
+    # Resolution tiers available to clients, from thumbnail to print quality
+    DPI_TIERS = {
+        'thumbnail': 36,
+        'low': 72,
+        'medium': 150,
+        'high': 300,
+    }
+    DEFAULT_TIER = 'low'
+    EVICT_TARGET = 0.9  # Evict down to this fraction of the budget so scans stay infrequent
+    RESCAN_INTERVAL = 300.0  # Seconds before re-measuring the cache, which other workers also fill
+
+    def __init__(self, cache_dir: str = "storage/page_cache", max_cache_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        # cache_path -> [lock, number of threads using it]; entries are dropped once unused
+        self._render_locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+        self._cache_bytes: Optional[int] = None  # Estimated size; None until first measured
+        self._last_scan = 0.0
+        self._size_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def resolve_dpi(cls, tier: Optional[str]) -> Optional[int]:
+        """Map a tier name (or a DPI value matching a tier) to its DPI."""
+        if not tier:
+            return cls.DPI_TIERS[cls.DEFAULT_TIER]
+        if tier in cls.DPI_TIERS:
+            return cls.DPI_TIERS[tier]
+        if tier.isdigit() and int(tier) in cls.DPI_TIERS.values():
+            return int(tier)
+        return None
+
+    @staticmethod
+    def is_valid_id(pdf_id: str) -> bool:
+        """Check that a document id is a UUID as issued by DBManager.save_pdf."""
+        try:
+            return str(uuid.UUID(pdf_id)) == pdf_id
+        except (TypeError, ValueError, AttributeError):
+            return False
+
+    def _get_doc_dir(self, pdf_id: str) -> str:
+        """Get the cache directory of a document, refusing ids that could escape the cache."""
+        if not self.is_valid_id(pdf_id):
+            raise ValueError(f"Invalid document id: {pdf_id!r}")
+        cache_root = os.path.realpath(self.cache_dir)
+        doc_dir = os.path.realpath(os.path.join(cache_root, pdf_id))
+        if os.path.dirname(doc_dir) != cache_root:
+            raise ValueError(f"Document cache path escapes {self.cache_dir}: {doc_dir}")
+        return doc_dir
+
+    def _get_cache_path(self, pdf_id: str, page_num: int, dpi: int) -> str:
+        """Get the path where a rendered page should be cached."""
+        return os.path.join(self._get_doc_dir(pdf_id), str(dpi), f"{page_num}.png")
+
+    @contextmanager
+    def _render_lock(self, cache_path: str):
+        """Serialise renders of a single cache entry; the lock is discarded once unused."""
+        with self._locks_guard:
+            entry = self._render_locks.get(cache_path)
+            if entry is None:
+                entry = self._render_locks[cache_path] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._render_locks[cache_path]
+
+    @staticmethod
+    def _touch(cache_path: str) -> bool:
+        """Mark a cached image as recently used. Returns False if it is not cached."""
+        try:
+            # Refresh the modification time so eviction treats the entry as recently used
+            os.utime(cache_path, None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def get_etag(pdf_path: str, page_num: int, dpi: int) -> str:
+        """Build an ETag for a rendered page from the source file's identity."""
+        stat = os.stat(pdf_path)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{page_num}-{dpi}"
+
+    def render_page(self, pdf_id: str, pdf_path: str, page_num: int, dpi: int) -> str:
+        """Return the path of a cached PNG for a page, rendering it on a cache miss.
+
+        Pages are numbered from 1. Raises IndexError if the page does not exist.
+        """
+        cache_path = self._get_cache_path(pdf_id, page_num, dpi)
+        if self._touch(cache_path):
+            return cache_path
+
+        with self._render_lock(cache_path):
+            if self._touch(cache_path):
+                return cache_path
+
+            with DocumentSessionCache.get_shared().open(pdf_path) as doc, DocumentSession.FITZ_LOCK:
+                if page_num < 1 or page_num > len(doc):
+                    raise IndexError(f"Page {page_num} out of range (1-{len(doc)})")
+                png_bytes = doc[page_num - 1].get_pixmap(dpi=dpi).tobytes("png")
+
+            # Write to a temporary file and rename so other workers never see partial images
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(png_bytes)
+                os.replace(temp_path, cache_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        self._account(len(png_bytes))
+        return cache_path
+
+    def _account(self, added_bytes: int):
+        """Add a new image to the size estimate and evict once over budget.
+
+        The directory is only scanned when the estimate exceeds the budget or
+        has not been refreshed for RESCAN_INTERVAL, not on every miss.
+        """
+        with self._size_lock:
+            if self._cache_bytes is not None:
+                self._cache_bytes += added_bytes
+            stale = time.monotonic() - self._last_scan > self.RESCAN_INTERVAL
+            needs_scan = self._cache_bytes is None or self._cache_bytes > self.max_cache_bytes or stale
+        if needs_scan:
+            self.evict()
+
+    def _list_entries(self) -> List[Tuple[float, int, str]]:
+        """List cached images as (mtime, size, path) tuples."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used images until the cache fits its byte budget.
+
+        Once over budget, evicts down to EVICT_TARGET of it. Concurrent callers
+        skip the scan while another thread is already evicting.
+        """
+        if not self._evict_lock.acquire(blocking=False):
+            return 0
+        try:
+            entries = self._list_entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            if total > self.max_cache_bytes:
+                target = self.max_cache_bytes * self.EVICT_TARGET
+                for _, size, path in sorted(entries):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            with self._size_lock:
+                self._cache_bytes = total
+                self._last_scan = time.monotonic()
+            return removed
+        finally:
+            self._evict_lock.release()
+
+    def invalidate(self, pdf_id: str):
+        """Remove all cached renders of a document.
+
+        Raises ValueError if ``pdf_id`` is not a valid document id.
+        """
+        doc_dir = self._get_doc_dir(pdf_id)
+        try:
+            if os.path.isdir(doc_dir):
+                shutil.rmtree(doc_dir)
+        except Exception as e:
+            print(f"Error invalidating page cache: {e}")
+        self._reset_size()
+
+    def clear(self):
+        """Remove every cached render.
+
+        Only per-document directories inside the cache are removed, never the
+        cache directory itself or anything it does not own.
+        """
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                names = [entry.name for entry in entries]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            try:
+                doc_dir = self._get_doc_dir(name)
+            except ValueError:
+                continue  # Not a document directory (e.g. stray temp files); leave it alone
+            try:
+                shutil.rmtree(doc_dir, ignore_errors=True)
+            except Exception as e:
+                print(f"Error clearing page cache: {e}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._reset_size()
+
+    def _reset_size(self):
+        """Forget the size estimate so the next render re-measures the cache."""
+        with self._size_lock:
+            self._cache_bytes = None
@@ -1,19 +1,22 @@
-import PyPDF2
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import importlib.util
 import os
-import fitz  # PyMuPDF
-import io
-import base64
-import tabula
-import pandas as pd
-import numpy as np
 import re
+import tempfile
 from PIL import Image
+from Libraries.image_pipeline import ImagePipeline
+from Libraries.document_session import DocumentSession, DocumentSessionCache
 
 class PDFProcessor:
+    # Shared pipeline so the encoding thread pool is reused across documents
+    image_pipeline = ImagePipeline.from_env()
+
     @staticmethod
     def clean_table_data(df):
         """Clean table data by replacing NaN values and converting to native Python types."""
+        import numpy as np
+        import pandas as pd
+
         if isinstance(df, pd.DataFrame):
             df = df.replace({np.nan: None})
             records = df.to_dict('records')
@@ -78,8 +81,13 @@ class PDFProcessor:
     def extract_text_from_page(page) -> str:
         """Extract text from a page while preserving layout."""
         # Get text with better layout preservation
-        text = page.get_text("dict")
-        
+        with DocumentSession.FITZ_LOCK:
+            text = page.get_text("dict")
+        return PDFProcessor.text_from_dict(text)
+
+    @staticmethod
+    def text_from_dict(text: Dict[str, Any]) -> str:
+        """Join the blocks of a page's ``get_text("dict")`` output into text."""
         blocks = []
         for block in text["blocks"]:
             if "lines" in block:
@@ -202,39 +210,53 @@ class PDFProcessor:
         return '\n\n'.join(formatted_paragraphs)
 
     @staticmethod
-    def extract_text(filepath: str) -> dict:
+    def extract_text(filepath: str, image_pipeline: ImagePipeline = None) -> dict:
         """Extract text and metadata from a PDF file."""
         try:
-            doc = fitz.open(filepath)
             content = []
-            total_pages = len(doc)
+            raw_images = []
+            seen_xrefs = {}
+            pipeline = image_pipeline or PDFProcessor.image_pipeline
             
-            for page_num in range(total_pages):
-                page = doc[page_num]
-                
-                # Extract text with better layout preservation
-                text = PDFProcessor.extract_text_from_page(page)
-                text = PDFProcessor.clean_text(text)
-                
-                # Only format as math if it's actually mathematical content
-                if PDFProcessor.is_math_content(text):
-                    text = PDFProcessor.format_math_expressions(text)
-                
-                # Extract tables if any
-                tables = PDFProcessor.extract_tables(page)
-                
-                # Extract images if any
-                images = PDFProcessor.extract_images(page)
+            # Reuse the document already parsed for this file (e.g. by is_valid_pdf)
+            with DocumentSessionCache.get_shared().open(filepath) as doc:
+                with DocumentSession.FITZ_LOCK:
+                    total_pages = len(doc)
+                    metadata = doc.metadata
                 
-                content.append({
-                    'page': page_num + 1,
-                    'content': text,
-                    'tables': tables,
-                    'images': images
-                })
+                for page_num in range(total_pages):
+                    # Copy out what PyMuPDF provides for the page and release the
+                    # lock before cleaning text and running tabula
+                    with DocumentSession.FITZ_LOCK:
+                        page = doc[page_num]
+                        page_dict = page.get_text("dict")
+                        # Collect raw images; they are filtered and encoded together below
+                        raw_images.extend(PDFProcessor.collect_images(page, seen_xrefs, pipeline))
+                        table_image = PDFProcessor.render_table_image(page)
+                        del page
+                    
+                    # Extract text with better layout preservation
+                    text = PDFProcessor.text_from_dict(page_dict)
+                    text = PDFProcessor.clean_text(text)
+                    
+                    # Only format as math if it's actually mathematical content
+                    if PDFProcessor.is_math_content(text):
+                        text = PDFProcessor.format_math_expressions(text)
+                    
+                    # Extract tables if any
+                    tables = PDFProcessor.extract_tables_from_image(table_image)
+                    
+                    content.append({
+                        'page': page_num + 1,
+                        'content': text,
+                        'tables': tables,
+                        'images': []
+                    })
             
-            # Extract metadata
-            metadata = doc.metadata
+            # Encode the document's images in parallel within one byte budget
+            for raw, image in zip(raw_images, pipeline.process(raw_images)):
+                if image:
+                    content[raw['page'] - 1]['images'].append(image)
             
             return {
                 'success': True,
@@ -248,27 +270,44 @@ class PDFProcessor:
                 'success': False,
                 'error': str(e)
             }
-        finally:
-            if 'doc' in locals():
-                doc.close()
 
     @staticmethod
     def extract_tables(page) -> List[List[List[str]]]:
         """Extract tables from a page."""
-        try:
-            # Convert page to image
+        return PDFProcessor.extract_tables_from_image(PDFProcessor.render_table_image(page))
+
+    @staticmethod
+    def render_table_image(page) -> Optional[Image.Image]:
+        """Render a page for table extraction, or None when tabula is not installed."""
+        if importlib.util.find_spec("tabula") is None:
+            return None
+        with DocumentSession.FITZ_LOCK:
             pix = page.get_pixmap()
             img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Save temporary image
-            temp_img_path = "temp_page.png"
-            img.save(temp_img_path)
-            
-            # Extract tables using tabula
-            tables = tabula.read_pdf(temp_img_path, pages=1, multiple_tables=True)
-            
-            # Clean up
-            os.remove(temp_img_path)
+            del pix
+        return img
+
+    @staticmethod
+    def extract_tables_from_image(img: Optional[Image.Image]) -> List[List[List[str]]]:
+        """Extract tables from a rendered page; runs without holding the PyMuPDF lock."""
+        if img is None:
+            return []
+        try:
+            # tabula and pandas are slow to import, so load them only when needed
+            import tabula
+            import pandas as pd
+
+            # Save temporary image; pages of other documents may be extracted concurrently
+            fd, temp_img_path = tempfile.mkstemp(suffix=".png")
+            os.close(fd)
+            try:
+                img.save(temp_img_path)
+                
+                # Extract tables using tabula
+                tables = tabula.read_pdf(temp_img_path, pages=1, multiple_tables=True)
+            finally:
+                # Clean up
+                os.remove(temp_img_path)
             
             # Convert tables to list format and clean data
             cleaned_tables = []
@@ -286,26 +325,49 @@ class PDFProcessor:
             return []
 
     @staticmethod
-    def extract_images(page) -> List[Dict[str, Any]]:
-        """Extract images from a page."""
+    def collect_images(page, seen_xrefs: Dict[int, bool] = None,
+                       image_pipeline: ImagePipeline = None) -> List[Dict[str, Any]]:
+        """Collect the raw embedded images of a page without encoding them.
+
+        Images the pipeline would filter out by size are skipped before their
+        bytes are kept. ``seen_xrefs`` maps each xref already collected from the
+        document to whether it was kept; repeats of a kept image are returned
+        as ``{'page', 'xref'}`` references without extracting it again.
+        """
+        pipeline = image_pipeline or PDFProcessor.image_pipeline
+        seen_xrefs = {} if seen_xrefs is None else seen_xrefs
         images = []
         try:
-            for img_index, img in enumerate(page.get_images()):
+            with DocumentSession.FITZ_LOCK:
+                page_images = page.get_images()
+                page_number = page.number + 1
+            for img_index, img in enumerate(page_images):
                 try:
                     xref = img[0]
-                    base_image = page.parent.extract_image(xref)
+                    if xref in seen_xrefs:
+                        if seen_xrefs[xref]:
+                            images.append({'page': page_number, 'xref': xref})
+                        continue
+                    # get_images reports the dimensions, so tiny or extreme images are never extracted
+                    if not pipeline.passes_dimension_filter(img[2], img[3]):
+                        seen_xrefs[xref] = False
+                        continue
+                    with DocumentSession.FITZ_LOCK:
+                        base_image = page.parent.extract_image(xref)
                     
+                    raw = None
                     if base_image:
-                        image_data = base_image["image"]
-                        image_ext = base_image["ext"]
-                        
-                        # Convert to base64
-                        base64_data = base64.b64encode(image_data).decode('utf-8')
-                        
-                        images.append({
-                            'data': f'data:image/{image_ext};base64,{base64_data}',
-                            'type': image_ext
-                        })
+                        raw = {
+                            'page': page_number,
+                            'xref': xref,
+                            'image': base_image["image"],
+                            'ext': base_image["ext"],
+                            'width': base_image.get("width", 0),
+                            'height': base_image.get("height", 0)
+                        }
+                    seen_xrefs[xref] = raw is not None and pipeline.passes_size_filter(raw)
+                    if seen_xrefs[xref]:
+                        images.append(raw)
                 except Exception as e:
                     print(f"Error processing image {img_index}: {str(e)}")
                     continue
@@ -315,18 +377,37 @@ class PDFProcessor:
             
         return images
 
+    @staticmethod
+    def get_original_image(filepath: str, xref: int):
+        """Get the original bytes and extension of an embedded image, or None if xref is not an image."""
+        with DocumentSessionCache.get_shared().open(filepath) as doc, DocumentSession.FITZ_LOCK:
+            if xref < 1 or xref >= doc.xref_length():
+                return None
+            try:
+                base_image = doc.extract_image(xref)
+            except Exception:
+                return None
+        if not base_image or not base_image.get("image"):
+            return None
+        return base_image["image"], base_image["ext"]
+
+    @staticmethod
+    def extract_images(page, image_pipeline: ImagePipeline = None) -> List[Dict[str, Any]]:
+        """Extract images from a page."""
+        pipeline = image_pipeline or PDFProcessor.image_pipeline
+        return [image for image in pipeline.process(PDFProcessor.collect_images(page, image_pipeline=pipeline)) if image]
+
     @staticmethod
     def is_valid_pdf(file_path: str) -> bool:
         """Check if the file is a valid PDF."""
         try:
-            # Try to open with PyMuPDF
-            doc = fitz.open(file_path)
-            is_valid = doc.is_pdf
-            doc.close()
-            return is_valid
+            # Try to open with PyMuPDF; the parsed document is kept for extraction
+            with DocumentSessionCache.get_shared().open(file_path) as doc, DocumentSession.FITZ_LOCK:
+                return doc.is_pdf
         except Exception:
             try:
                 # Fallback to PyPDF2
+                import PyPDF2
                 with open(file_path, 'rb') as file:
                     PyPDF2.PdfReader(file)
                 return True
@@ -1,17 +1,30 @@
 from typing import Optional, List, Dict
 import os
 from llama_index.core import (
-    SimpleDirectoryReader,
+    Document,
     VectorStoreIndex,
-    StorageContext,
-    load_index_from_storage
+    get_response_synthesizer
 )
-from llama_index.core.settings import Settings
-from llama_index.llms.openai import OpenAI
-from pathlib import Path
+from llama_index.core.node_parser import SentenceSplitter
+from Libraries.llm_client import LLMClientPool
+from Libraries.layout_chunker import LayoutChunker
+from Libraries.index_residency import SharedIndexStore
+from Libraries.document_session import DocumentSession, DocumentSessionCache
 
 class RAGManager:
-    def __init__(self, openai_api_key: str):
+    CHUNK_SIZE = 1024
+    CHUNK_OVERLAP = 20
+    CHUNKING_STRATEGIES = ("layout", "fixed")
+    SIMILARITY_TOP_K = 2
+
+    def __init__(
+        self,
+        openai_api_key: str,
+        client_pool: LLMClientPool = None,
+        chunking: str = None,
+        index_store: SharedIndexStore = None,
+        chunk_size: int = None
+    ):
         """Initialize the RAG manager with OpenAI API key."""
         if not openai_api_key:
             raise ValueError("OpenAI API key is required")
@@ -19,17 +32,21 @@ class RAGManager:
         self.openai_api_key = openai_api_key
         self.index_dir = "storage/indices"
         
-        # Set OpenAI API key
-        import openai
-        openai.api_key = openai_api_key
+        # "fixed" uses plain token windows; "layout" chunks along headings, tables and equations
+        self.chunking = chunking or os.environ.get("RAG_CHUNKING", "fixed")
+        if self.chunking not in self.CHUNKING_STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy: {self.chunking}")
+        # Maximum tokens per chunk; None keeps each strategy's default (1024 fixed, 512 layout)
+        self.chunk_size = chunk_size
+        self.similarity_top_k = self.SIMILARITY_TOP_K
         
-        # Create LLM with API key
-        self.llm = OpenAI(api_key=openai_api_key)
+        # Reuse pooled clients for this key instead of configuring global Settings
+        self.client_pool = client_pool or LLMClientPool.get_shared()
+        self.llm = self.client_pool.get_llm(openai_api_key)
+        self.embed_model = self.client_pool.get_embed_model(openai_api_key)
         
-        # Configure settings
-        Settings.llm = self.llm
-        Settings.chunk_size = 1024
-        Settings.chunk_overlap = 20
+        # Indices are held once per host in shared memory and attached read-only
+        self.index_store = index_store or SharedIndexStore.get_shared()
         
         # Create storage directory if it doesn't exist
         os.makedirs(self.index_dir, exist_ok=True)
@@ -43,17 +60,45 @@ class RAGManager:
         index_path = self._get_index_path(doc_id)
         return os.path.exists(index_path)
     
+    def create_index(self, pdf_path: str) -> VectorStoreIndex:
+        """Build an in-memory index of a PDF using the configured chunking strategy."""
+        # Reuse the document already parsed for extraction instead of reading the file again
+        file_name = os.path.basename(pdf_path)
+        with DocumentSessionCache.get_shared().open(pdf_path) as doc:
+            if self.chunking == "layout":
+                chunker = LayoutChunker(max_tokens=self.chunk_size) if self.chunk_size else LayoutChunker()
+                nodes = chunker.to_nodes(chunker.chunk_document(doc), source=file_name)
+            else:
+                with DocumentSession.FITZ_LOCK:
+                    page_count = len(doc)
+                documents = []
+                for page_num in range(page_count):
+                    with DocumentSession.FITZ_LOCK:
+                        text = doc[page_num].get_text()
+                    documents.append(Document(
+                        text=text,
+                        metadata={"page_label": str(page_num + 1), "file_name": file_name}
+                    ))
+
+        if self.chunking == "layout":
+            return VectorStoreIndex(nodes, embed_model=self.embed_model)
+
+        return VectorStoreIndex.from_documents(
+            documents,
+            embed_model=self.embed_model,
+            transformations=[
+                SentenceSplitter(chunk_size=self.chunk_size or self.CHUNK_SIZE, chunk_overlap=self.CHUNK_OVERLAP)
+            ]
+        )
+
     def index_document(self, pdf_path: str, doc_id: str) -> bool:
         """Index a PDF document and store its index."""
         try:
-            # Load document
-            documents = SimpleDirectoryReader(input_files=[pdf_path]).load_data()
+            index = self.create_index(pdf_path)
             
-            # Create index
-            index = VectorStoreIndex.from_documents(documents)
-            
-            # Save index
+            # Save index and drop any shared copy of a previous version
             index.storage_context.persist(persist_dir=self._get_index_path(doc_id))
+            self.index_store.invalidate(doc_id)
             return True
             
         except Exception as e:
@@ -66,15 +111,10 @@ class RAGManager:
             if not self.is_indexed(doc_id):
                 return "Document is not indexed yet. Please index it first."
             
-            # Load the existing index
-            storage_context = StorageContext.from_defaults(
-                persist_dir=self._get_index_path(doc_id)
-            )
-            index = load_index_from_storage(storage_context)
-            
-            # Query the index
-            query_engine = index.as_query_engine()
-            response = query_engine.query(query)
+            # Retrieve the closest chunks and let the LLM answer from them
+            nodes = self.retrieve(doc_id, query)
+            synthesizer = get_response_synthesizer(llm=self.llm)
+            response = synthesizer.synthesize(query, nodes)
             
             return str(response)
             
@@ -82,9 +122,17 @@ class RAGManager:
             print(f"Error querying document: {e}")
             return None
     
+    def retrieve(self, doc_id: str, query: str):
+        """Return the chunks of an indexed document closest to a query."""
+        # Attach to the shared copy of the index instead of loading it into this process
+        resident = self.index_store.get(doc_id, self._get_index_path(doc_id))
+        query_embedding = self.embed_model.get_query_embedding(query)
+        return resident.retrieve(query_embedding, self.similarity_top_k)
+    
     def remove_index(self, doc_id: str) -> bool:
         """Remove the index for a document."""
         try:
+            self.index_store.invalidate(doc_id)
             index_path = self._get_index_path(doc_id)
             if os.path.exists(index_path):
                 import shutil
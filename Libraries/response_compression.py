@@ -0,0 +1,69 @@
+import gzip
+import zlib
+from typing import List, Optional
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+class ResponseCompressor:
+    """Negotiate and apply gzip/brotli compression for large responses."""
+
+    MIN_SIZE = 1024  # Smaller bodies are not worth compressing
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5
+    SAMPLE_SIZE = 16 * 1024  # Bytes per slice used to estimate compressibility of large bodies
+    SAMPLE_SLICES = 4
+    MAX_SAMPLE_RATIO = 0.9  # Skip compression when samples shrink by less than 10%
+
+    @staticmethod
+    def supported_encodings() -> List[str]:
+        """List supported encodings in order of server preference."""
+        return (['br'] if brotli is not None else []) + ['gzip']
+
+    @staticmethod
+    def choose_encoding(accept_encodings) -> Optional[str]:
+        """Pick the best encoding from a werkzeug Accept-Encoding header object."""
+        return accept_encodings.best_match(ResponseCompressor.supported_encodings())
+
+    @staticmethod
+    def compress(data: bytes, encoding: str) -> bytes:
+        """Compress a body with the given content encoding."""
+        if encoding == 'br':
+            return brotli.compress(data, quality=ResponseCompressor.BROTLI_QUALITY)
+        if encoding == 'gzip':
+            return gzip.compress(data, compresslevel=ResponseCompressor.GZIP_LEVEL)
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    @staticmethod
+    def is_compressible(data: bytes) -> bool:
+        """Estimate from a few evenly spaced slices whether compressing a body pays off."""
+        sample_size = ResponseCompressor.SAMPLE_SIZE
+        slices = ResponseCompressor.SAMPLE_SLICES
+        if len(data) <= sample_size * slices:
+            return True
+        step = (len(data) - sample_size) // (slices - 1)
+        sample = b"".join(data[i * step:i * step + sample_size] for i in range(slices))
+        return len(zlib.compress(sample, 1)) < len(sample) * ResponseCompressor.MAX_SAMPLE_RATIO
+
+    @staticmethod
+    def compress_response(response, accept_encodings):
+        """Compress a Flask response in place when the client accepts it."""
+        if (response.direct_passthrough
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < ResponseCompressor.MIN_SIZE or not ResponseCompressor.is_compressible(data):
+            return response
+
+        encoding = ResponseCompressor.choose_encoding(accept_encodings)
+        if not encoding:
+            return response
+
+        response.set_data(ResponseCompressor.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+import struct
+import zlib
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+class ResultCodec:
+    """Versioned binary storage format for extraction results.
+
+    Layout (all integers big-endian):
+        MAGIC | version (1 byte) | header length (4 bytes) | header | page blobs | image blobs
+
+    The header is zlib-compressed compact JSON holding every top-level field
+    except ``content`` plus the (offset, length) of each page blob. Each page is
+    compressed on its own so a single page can be decoded without touching the
+    rest of the document.
+
+    Since version 2, base64 image data URIs are stored as raw bytes after the
+    page blobs instead of inside them: JPEG and PNG data does not compress, and
+    inflating it again dominated decoding time. A page then refers to its
+    images as ``{"$image": [offset, length, prefix]}`` and the data URI is
+    rebuilt on access. Version 1 data remains readable.
+    """
+
+    MAGIC = b"PDFXR"
+    VERSION = 2
+    SUPPORTED_VERSIONS = (1, 2)
+    COMPRESSION_LEVEL = 6
+    IMAGE_REF = "$image"
+    _PREFIX = struct.Struct(">BI")
+
+    @staticmethod
+    def _dumps(value: Any, json_encoder: Type[json.JSONEncoder]) -> bytes:
+        return json.dumps(value, cls=json_encoder, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def _split_data_uri(value: Any):
+        """Split a base64 data URI into (prefix, raw bytes), or None for anything else."""
+        if not isinstance(value, str) or not value.startswith("data:"):
+            return None
+        prefix, separator, payload = value.partition(";base64,")
+        if not separator:
+            return None
+        try:
+            return prefix + separator, base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+
+    @staticmethod
+    def _extract_images(page: Any, images: bytearray) -> Any:
+        """Copy a page with image data URIs replaced by references into ``images``."""
+        if not isinstance(page, dict) or not page.get("images"):
+            return page
+
+        def extract(image):
+            if not isinstance(image, dict):
+                return image
+            image = dict(image)
+            split = ResultCodec._split_data_uri(image.get("data"))
+            if split is not None:
+                prefix, raw = split
+                image["data"] = {ResultCodec.IMAGE_REF: [len(images), len(raw), prefix]}
+                images.extend(raw)
+            if isinstance(image.get("original"), dict):
+                image["original"] = extract(image["original"])
+            return image
+
+        page = dict(page)
+        page["images"] = [extract(image) for image in page["images"]]
+        return page
+
+    @staticmethod
+    def encode(result: Dict[str, Any], json_encoder: Type[json.JSONEncoder] = json.JSONEncoder) -> bytes:
+        """Encode an extraction result into the binary storage format."""
+        fields = {key: value for key, value in result.items() if key != "content"}
+        body = bytearray()
+        images = bytearray()
+        pages = []
+        for page in result.get("content") or []:
+            page = ResultCodec._extract_images(page, images)
+            blob = zlib.compress(ResultCodec._dumps(page, json_encoder), ResultCodec.COMPRESSION_LEVEL)
+            pages.append([len(body), len(blob)])
+            body.extend(blob)
+
+        header = zlib.compress(
+            ResultCodec._dumps({"fields": fields, "pages": pages, "images": len(body)}, json_encoder),
+            ResultCodec.COMPRESSION_LEVEL
+        )
+        prefix = ResultCodec._PREFIX.pack(ResultCodec.VERSION, len(header))
+        return ResultCodec.MAGIC + prefix + header + bytes(body) + bytes(images)
+
+    @staticmethod
+    def is_encoded(data: Union[str, bytes, None]) -> bool:
+        """Check whether stored data uses the binary format rather than legacy JSON."""
+        return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(ResultCodec.MAGIC)]) == ResultCodec.MAGIC
+
+    @staticmethod
+    def decode(data: Union[str, bytes, None]) -> "StoredResult":
+        """Decode stored data, accepting both the binary format and legacy JSON rows."""
+        if not data:
+            return StoredResult({}, None, None)
+        if not ResultCodec.is_encoded(data):
+            # Legacy rows hold the whole result as plain JSON text
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                data = bytes(data).decode("utf-8")
+            result = json.loads(data)
+            content = result.pop("content", None)
+            return StoredResult(result, content, None)
+
+        data = bytes(data)
+        start = len(ResultCodec.MAGIC)
+        version, header_length = ResultCodec._PREFIX.unpack_from(data, start)
+        if version not in ResultCodec.SUPPORTED_VERSIONS:
+            raise ValueError(f"Unsupported result format version: {version}")
+
+        header_start = start + ResultCodec._PREFIX.size
+        body_start = header_start + header_length
+        header = json.loads(zlib.decompress(data[header_start:body_start]))
+        pages = [(body_start + offset, length) for offset, length in header["pages"]]
+        # Version 1 has no image section
+        images_start = body_start + header["images"] if "images" in header else None
+        return StoredResult(header["fields"], pages, data, images_start)
+
+class LazyPages(Sequence):
+    """Sequence of pages that decompresses each page on first access."""
+
+    def __init__(self, pages: List[Tuple[int, int]], data: bytes, images_start: Optional[int] = None):
+        self._pages = pages
+        self._data = data
+        self._images_start = images_start
+        self._decoded: Dict[int, Any] = {}
+
+    def _restore_images(self, page: Any) -> Any:
+        """Rebuild the image data URIs referenced by a decoded page."""
+        if self._images_start is None or not isinstance(page, dict):
+            return page
+
+        def restore(image):
+            if not isinstance(image, dict):
+                return image
+            ref = image.get("data")
+            if isinstance(ref, dict) and ResultCodec.IMAGE_REF in ref:
+                offset, length, prefix = ref[ResultCodec.IMAGE_REF]
+                start = self._images_start + offset
+                image["data"] = prefix + base64.b64encode(self._data[start:start + length]).decode("ascii")
+            if isinstance(image.get("original"), dict):
+                restore(image["original"])
+            return image
+
+        for image in page.get("images") or []:
+            restore(image)
+        return page
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index not in self._decoded:
+            offset, length = self._pages[index]
+            page = json.loads(zlib.decompress(self._data[offset:offset + length]))
+            self._decoded[index] = self._restore_images(page)
+        return self._decoded[index]
+
+class StoredResult(Mapping):
+    """Read-only view of a stored extraction result with lazily decoded pages."""
+
+    def __init__(self, fields: Dict[str, Any], pages, data, images_start: Optional[int] = None):
+        self._fields = fields
+        if data is None:
+            # Legacy JSON: pages are already decoded (or absent)
+            self._content = pages
+        else:
+            self._content = LazyPages(pages, data, images_start)
+
+    def __getitem__(self, key):
+        if key == "content":
+            if self._content is None:
+                raise KeyError(key)
+            return self._content
+        return self._fields[key]
+
+    def __iter__(self):
+        yield from self._fields
+        if self._content is not None:
+            yield "content"
+
+    def __len__(self) -> int:
+        return len(self._fields) + (self._content is not None)
+
+    def get_page(self, index: int) -> Any:
+        """Return a single decoded page by zero-based index."""
+        return self["content"][index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Fully decode the result into a plain dictionary."""
+        result = dict(self._fields)
+        if self._content is not None:
+            result["content"] = list(self._content)
+        return result
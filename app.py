@@ -1,12 +1,14 @@
 from flask import Flask, render_template, request, jsonify, send_file
 from werkzeug.utils import secure_filename
+import io
 import os
 from Libraries.pdf_processor import PDFProcessor
 from Libraries.db_manager import DBManager
-from Libraries.rag_manager import RAGManager
+from Libraries.page_renderer import PageRenderer
+from Libraries.document_session import DocumentSessionCache
+from Libraries.response_compression import ResponseCompressor
 import shutil
 import sqlite3
-import openai
 from functools import wraps
 import logging
 
@@ -19,6 +21,8 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['STORAGE_FOLDER'] = 'storage'
 app.config['INDICES_FOLDER'] = 'storage/indices'
+app.config['PAGE_CACHE_FOLDER'] = 'storage/page_cache'
+app.config['PAGE_CACHE_MAX_BYTES'] = 512 * 1024 * 1024  # 512MB of rendered pages
 
 # Ensure required folders exist with proper permissions
 for folder in [app.config['UPLOAD_FOLDER'], app.config['STORAGE_FOLDER'], app.config['INDICES_FOLDER']]:
@@ -32,6 +36,7 @@ for folder in [app.config['UPLOAD_FOLDER'], app.config['STORAGE_FOLDER'], app.co
 
 ALLOWED_EXTENSIONS = {'pdf'}
 db_manager = DBManager()
+page_renderer = PageRenderer(app.config['PAGE_CACHE_FOLDER'], app.config['PAGE_CACHE_MAX_BYTES'])
 
 def require_api_key(f):
     @wraps(f)
@@ -42,6 +47,30 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def get_rag_manager(api_key):
+    # llama-index takes seconds to import, so only load it on the RAG code paths
+    from Libraries.rag_manager import RAGManager
+    return RAGManager(api_key)
+
+def warm_imports():
+    """Import the heavy optional dependencies up front.
+
+    Called from the gunicorn master when preloading so forked workers share the
+    imported modules copy-on-write instead of importing them on first request.
+    """
+    for module in ['Libraries.rag_manager', 'Libraries.llm_client', 'pandas', 'tabula', 'PyPDF2']:
+        try:
+            __import__(module)
+        except ImportError as e:
+            logger.warning(f"Could not preload {module}: {str(e)}")
+
+def compress_response(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = app.make_response(f(*args, **kwargs))
+        return ResponseCompressor.compress_response(response, request.accept_encodings)
+    return decorated_function
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -52,6 +81,9 @@ def index():
 @app.route('/chat', methods=['POST'])
 @require_api_key
 def chat():
+    import openai
+    from Libraries.llm_client import LLMClientPool
+
     try:
         api_key = request.headers.get('X-API-KEY')
         data = request.get_json()
@@ -64,7 +96,7 @@ def chat():
         
         if doc_id:
             # Use RAG for document-specific queries
-            rag_manager = RAGManager(api_key)
+            rag_manager = get_rag_manager(api_key)
             response = rag_manager.query_document(doc_id, data['message'])
             if response:
                 return jsonify({'success': True, 'response': response})
@@ -72,30 +104,30 @@ def chat():
                 return jsonify({'error': 'Failed to query document'}), 500
         else:
             # Use regular OpenAI chat for general queries
-            openai.api_key = api_key
             messages = [
                 {"role": "system", "content": "You are a helpful assistant that helps users understand PDF documents."}
             ]
             messages.append({"role": "user", "content": data['message']})
             
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
+            assistant_response = LLMClientPool.get_shared().chat(
+                api_key,
+                messages,
                 max_tokens=1000,
                 temperature=0.7
             )
-            
-            assistant_response = response.choices[0].message.content
             return jsonify({'success': True, 'response': assistant_response})
         
-    except openai.error.AuthenticationError:
+    except openai.AuthenticationError:
         return jsonify({'error': 'Invalid API key'}), 401
-    except openai.error.RateLimitError:
+    except openai.RateLimitError:
         return jsonify({'error': 'Rate limit exceeded'}), 429
+    except openai.APITimeoutError:
+        return jsonify({'error': 'The language model did not respond in time'}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/upload', methods=['POST'])
+@compress_response
 def upload_file():
     logger.debug("Upload endpoint called")
     if 'file' not in request.files:
@@ -119,6 +151,7 @@ def upload_file():
         
         if not PDFProcessor.is_valid_pdf(filepath):
             logger.error(f"Invalid PDF file: {filename}")
+            DocumentSessionCache.get_shared().discard(filepath)
             os.remove(filepath)
             return jsonify({'success': False, 'error': 'Invalid or corrupted PDF file'}), 400
         
@@ -126,7 +159,8 @@ def upload_file():
         logger.debug(f"Processing PDF: {filename}")
         result = PDFProcessor.extract_text(filepath)
         
-        # Clean up temporary file
+        # Clean up temporary file and the document parsed from it
+        DocumentSessionCache.get_shared().discard(filepath)
         os.remove(filepath)
         
         if not result['success']:
@@ -141,6 +175,7 @@ def upload_file():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/save_pdf', methods=['POST'])
+@compress_response
 def save_pdf():
     logger.debug("Save PDF endpoint called")
     if 'file' not in request.files:
@@ -163,6 +198,7 @@ def save_pdf():
         result = PDFProcessor.extract_text(temp_path)
         if not result['success']:
             logger.error(f"PDF processing failed: {result.get('error', 'Unknown error')}")
+            DocumentSessionCache.get_shared().discard(temp_path)
             os.remove(temp_path)
             return jsonify({'success': False, 'error': result['error']}), 400
         
@@ -190,34 +226,140 @@ def save_pdf():
     except Exception as e:
         logger.exception("Error in save_pdf")
         if os.path.exists(temp_path):
+            DocumentSessionCache.get_shared().discard(temp_path)
             os.remove(temp_path)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/pdf/<pdf_id>')
 def serve_pdf(pdf_id):
     try:
-        with sqlite3.connect(db_manager.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT file_path FROM pdfs WHERE id = ?', (pdf_id,))
-            row = cursor.fetchone()
-            if row:
-                return send_file(row[0], mimetype='application/pdf')
+        pdf_path = db_manager.get_pdf_path(pdf_id)
+        if pdf_path and os.path.exists(pdf_path):
+            # conditional=True answers Range, If-None-Match and If-Modified-Since requests
+            return send_file(os.path.abspath(pdf_path), mimetype='application/pdf', conditional=True, etag=True)
         return 'PDF not found', 404
     except Exception as e:
         return str(e), 500
 
+@app.route('/pdf/<pdf_id>/page/<int:page_num>')
+def serve_page(pdf_id, page_num):
+    return _send_page_image(pdf_id, page_num, request.args.get('dpi'))
+
+@app.route('/pdf/<pdf_id>/thumbnail/<int:page_num>')
+def serve_thumbnail(pdf_id, page_num):
+    return _send_page_image(pdf_id, page_num, 'thumbnail')
+
+def _send_page_image(pdf_id, page_num, tier):
+    try:
+        dpi = PageRenderer.resolve_dpi(tier)
+        if dpi is None:
+            return jsonify({'error': f"Invalid dpi. Use one of: {', '.join(PageRenderer.DPI_TIERS)}"}), 400
+
+        pdf_path = db_manager.get_pdf_path(pdf_id)
+        if not pdf_path or not os.path.exists(pdf_path):
+            return jsonify({'error': 'PDF not found'}), 404
+
+        etag = PageRenderer.get_etag(pdf_path, page_num, dpi)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        for attempt in range(2):
+            image_path = os.path.abspath(page_renderer.render_page(pdf_id, pdf_path, page_num, dpi))
+            try:
+                return send_file(
+                    image_path,
+                    mimetype='image/png',
+                    conditional=True,
+                    etag=etag,
+                    last_modified=os.path.getmtime(pdf_path),
+                    max_age=3600
+                )
+            except FileNotFoundError:
+                # Evicted by another thread or worker after rendering; treat it as a miss
+                if attempt:
+                    raise
+    except IndexError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.exception("Error rendering page")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/pdf/<pdf_id>/result')
+@compress_response
+def get_pdf_result(pdf_id):
+    try:
+        item = db_manager.get_pdf(pdf_id)
+        if item is None:
+            return jsonify({'error': 'PDF not found'}), 404
+
+        result = item['result'].to_dict()
+        result['id'] = item['id']
+        result['is_indexed'] = item['is_indexed']
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/pdf/<pdf_id>/image/<int:xref>')
+def serve_original_image(pdf_id, xref):
+    try:
+        pdf_path = db_manager.get_pdf_path(pdf_id)
+        if not pdf_path or not os.path.exists(pdf_path):
+            return jsonify({'error': 'PDF not found'}), 404
+
+        stat = os.stat(pdf_path)
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}-img-{xref}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        image = PDFProcessor.get_original_image(pdf_path, xref)
+        if image is None:
+            return jsonify({'error': 'Image not found'}), 404
+
+        data, ext = image
+        return send_file(
+            io.BytesIO(data),
+            mimetype=f'image/{"jpeg" if ext == "jpg" else ext}',
+            etag=etag,
+            last_modified=stat.st_mtime,
+            max_age=3600
+        )
+    except Exception as e:
+        logger.exception("Error serving image")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/pdf/<pdf_id>/content/<int:page_num>')
+def get_page_content(pdf_id, page_num):
+    try:
+        result = db_manager.get_result(pdf_id)
+        if result is None:
+            return jsonify({'error': 'PDF not found'}), 404
+
+        content = result.get('content') or []
+        if page_num < 1 or page_num > len(content):
+            return jsonify({'error': f'Page {page_num} out of range'}), 404
+
+        return jsonify(result.get_page(page_num - 1))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/history')
+@compress_response
 def get_history():
     try:
         history = db_manager.get_history()
         if not history:
             return jsonify([])
             
+        # Summaries only; the full result of a document is fetched from /pdf/<id>/result when opened
         return jsonify([{
             'id': item['id'],
             'name': item['name'],
             'timestamp': item['timestamp'],
-            'result': item['result'],
+            'total_pages': item['result'].get('total_pages'),
             'pdfUrl': f'/pdf/{item["id"]}',
             'is_indexed': item.get('is_indexed', False)  # Add indexing status
         } for item in history])
@@ -232,7 +374,10 @@ def get_history():
 @app.route('/remove_pdf/<pdf_id>', methods=['DELETE'])
 def remove_pdf(pdf_id):
     try:
-        db_manager.remove_pdf(pdf_id)
+        # Only ids known to the database reach the file system
+        if not db_manager.remove_pdf(pdf_id):
+            return jsonify({'success': False, 'error': 'PDF not found'}), 404
+        page_renderer.invalidate(pdf_id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -241,6 +386,7 @@ def remove_pdf(pdf_id):
 def clear_history():
     try:
         db_manager.clear_history()
+        page_renderer.clear()
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -257,7 +403,7 @@ def index_document(pdf_id):
             return jsonify({'error': 'PDF not found'}), 404
         
         # Create RAG manager and index document
-        rag_manager = RAGManager(api_key)
+        rag_manager = get_rag_manager(api_key)
         if rag_manager.index_document(pdf_path, pdf_id):
             # Update indexing status in database
             db_manager.update_index_status(pdf_id, True)
@@ -273,7 +419,7 @@ def index_document(pdf_id):
 def check_index(pdf_id):
     try:
         api_key = request.headers.get('X-API-KEY')
-        rag_manager = RAGManager(api_key)
+        rag_manager = get_rag_manager(api_key)
         is_indexed = rag_manager.is_indexed(pdf_id)
         return jsonify({'success': True, 'is_indexed': is_indexed})
     except Exception as e:
@@ -1,5 +1,20 @@
+import os
+
 bind = "0.0.0.0:10000"
 workers = 4
 threads = 4
 timeout = 120
-worker_class = "gthread" 
\ No newline at end of file
+worker_class = "gthread"
+
+# Load the app once in the master and fork workers from it, so read-only state
+# (imported modules, templates, DB schema setup) is shared copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# When preloading, also import the lazily loaded heavy dependencies in the master
+preload_heavy_imports = os.environ.get("GUNICORN_WARM_IMPORTS", "true").lower() in ("1", "true", "yes")
+
+def when_ready(server):
+    if preload_app and preload_heavy_imports:
+        from app import warm_imports as warm
+        warm()
+        server.log.info("Preloaded heavy dependencies in the master process")
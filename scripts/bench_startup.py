@@ -0,0 +1,94 @@
+"""Measure import time and cold-start latency of the Flask app.
+
+Each run starts a fresh interpreter in a scratch working directory (the app
+creates its folders and database relative to the working directory) and
+reports:
+    import      time to ``import app``
+    first_req   time from import finished to the first ``/`` and ``/history`` responses
+    cold_start  process launch to first response, including interpreter boot;
+                measured by the child, so interpreter teardown is not included
+    warm        time ``warm_imports()`` takes, i.e. what preloading moves to the master
+
+Usage:
+    python scripts/bench_startup.py --runs 5
+    python scripts/bench_startup.py --importtime   # top modules by cumulative import time
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The launch time is passed in as wall-clock time, which parent and child share
+CHILD_SCRIPT = """
+import json, sys, time
+launched = float(sys.argv[1])
+sys.path.insert(0, {repo!r})
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+client.get('/history')
+t2 = time.perf_counter()
+cold_start = time.time() - launched
+app.warm_imports()
+t3 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'first_req': t2 - t1, 'cold_start': cold_start, 'warm': t3 - t2}}))
+"""
+
+def run_once() -> dict:
+    """Start a fresh interpreter and collect its timings."""
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT.format(repo=REPO_ROOT), repr(time.time())],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def import_profile(top: int):
+    """Print the modules with the largest cumulative import time."""
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {REPO_ROOT!r}); import app"],
+            cwd=workdir,
+            capture_output=True,
+            text=True
+        )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import time and cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports instead")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.importtime:
+        import_profile(args.top)
+        return
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'metric':<12} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for metric in ["import", "first_req", "cold_start", "warm"]:
+        values = [run[metric] * 1000 for run in runs]
+        print(f"{metric:<12} {statistics.median(values):10.1f} {min(values):10.1f} {max(values):10.1f}")
+
+if __name__ == "__main__":
+    main()
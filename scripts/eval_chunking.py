@@ -0,0 +1,153 @@
+"""Compare layout-aware chunking against fixed-size chunking.
+
+Indexes a PDF with each strategy against the local OpenAI stub and runs the
+same queries through the production path used by /chat: RAGManager.index_document,
+the shared memory-mapped index and RAGManager.query_document. Reports per
+strategy and top_k.
+Both strategies use the same maximum chunk size (512 tokens unless
+--chunk-size says otherwise), so differences come from where chunks are cut
+rather than how large they may grow. Pass --chunk-size 0 to compare each
+strategy's production default instead (1024 fixed, 512 layout).
+
+The stub's word-hash embeddings only approximate lexical overlap, so this
+measures cost (tokens, latency), not answer quality.
+Columns:
+    chunks          number of nodes in the index
+    index s         time to chunk, embed and persist the document
+    prompt tokens   mean tokens sent to the LLM per query (as counted by the stub)
+    context tokens  mean tokens of retrieved chunks, as formatted for the LLM, per query
+    p50/p95 ms      query latency
+
+Usage:
+    python scripts/eval_chunking.py storage/paper.pdf
+    python scripts/eval_chunking.py storage/paper.pdf --top-k 2,4 --chunk-size 256
+    python scripts/eval_chunking.py storage/paper.pdf --queries queries.txt --latency-ms 300
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_openai_server import start_server
+
+DEFAULT_QUERIES = [
+    "What problem does this document address?",
+    "Summarize the main contributions.",
+    "What experiments or evaluations are reported?",
+    "What are the key results shown in the tables?",
+    "Which limitations or future work are mentioned?",
+]
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def build_index(strategy: str, pdf_path: str, chunk_size: int):
+    """Index the PDF with one strategy as /index_document does.
+
+    Returns the RAG manager, the document id, the number of chunks and the build time.
+    """
+    from Libraries.index_residency import SharedIndexStore
+    from Libraries.llm_client import LLMClientPool
+    from Libraries.rag_manager import RAGManager
+
+    pool = LLMClientPool(max_retries=0)
+    index_store = SharedIndexStore(root=os.path.abspath(os.path.join("index_cache", strategy)))
+    rag_manager = RAGManager(
+        "sk-eval", client_pool=pool, chunking=strategy, index_store=index_store, chunk_size=chunk_size or None
+    )
+
+    doc_id = f"eval-{strategy}"
+    start = time.perf_counter()
+    if not rag_manager.index_document(pdf_path, doc_id):
+        raise RuntimeError(f"Indexing with {strategy} chunking failed")
+    seconds = time.perf_counter() - start
+    chunks = len(index_store.get(doc_id, rag_manager._get_index_path(doc_id)).nodes)
+    return rag_manager, doc_id, chunks, seconds
+
+def evaluate(rag_manager, doc_id: str, queries, stats, top_k: int):
+    """Run every query through RAGManager.query_document and measure what reaches the LLM."""
+    from Libraries.layout_chunker import count_tokens
+
+    rag_manager.similarity_top_k = top_k
+    latencies, prompt_tokens, context_tokens = [], [], []
+    for query in queries:
+        before = stats["prompt_tokens"]
+        start = time.perf_counter()
+        response = rag_manager.query_document(doc_id, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response is None:
+            raise RuntimeError(f"Query failed: {query}")
+        prompt_tokens.append(stats["prompt_tokens"] - before)
+        # Retrieve again outside the timed call to see which chunk texts were sent
+        nodes = rag_manager.retrieve(doc_id, query)
+        context_tokens.append(sum(count_tokens(node.node.get_content(metadata_mode="llm")) for node in nodes))
+
+    return {
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "context_tokens": statistics.mean(context_tokens),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare layout-aware and fixed-size chunking.")
+    parser.add_argument("pdf", help="PDF file to index")
+    parser.add_argument("--queries", help="Text file with one query per line")
+    parser.add_argument("--top-k", default="2,4", help="Comma-separated chunks retrieved per query")
+    parser.add_argument("--chunk-size", type=int, default=512,
+                        help="Maximum tokens per chunk for both strategies; 0 keeps each strategy's default")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated LLM latency")
+    args = parser.parse_args()
+
+    # Keep per-request HTTP logging out of the report
+    logging.disable(logging.INFO)
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    server = start_server(latency_ms=args.latency_ms)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    stats = server.RequestHandlerClass.stats
+    pdf_path = os.path.abspath(args.pdf)
+
+    top_ks = [int(value) for value in args.top_k.split(",")]
+    strategies = ["fixed", "layout"]
+
+    # RAGManager creates its storage folders relative to the working directory
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        for strategy in strategies:
+            rag_manager, doc_id, chunks, index_seconds = build_index(strategy, pdf_path, args.chunk_size)
+            for top_k in top_ks:
+                result = evaluate(rag_manager, doc_id, queries, stats, top_k)
+                result.update(chunks=chunks, index_s=index_seconds)
+                results[strategy, top_k] = result
+
+    chunk_size = args.chunk_size or "defaults (fixed 1024, layout 512)"
+    print(f"{len(queries)} queries, max chunk tokens: {chunk_size}")
+    print(f"{'strategy':<10} {'top_k':>5} {'chunks':>7} {'index s':>8} {'prompt tok':>11} {'context tok':>12} {'p50 ms':>8} {'p95 ms':>8}")
+    for (strategy, top_k), r in results.items():
+        print(f"{strategy:<10} {top_k:>5} {r['chunks']:>7} {r['index_s']:>8.2f} {r['prompt_tokens']:>11.0f} "
+              f"{r['context_tokens']:>12.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+
+    for top_k in top_ks:
+        fixed, layout = results["fixed", top_k]["prompt_tokens"], results["layout", top_k]["prompt_tokens"]
+        if fixed:
+            change = 100 * (layout - fixed) / fixed
+            print(f"top_k={top_k}: layout sends {abs(change):.1f}% {'more' if change > 0 else 'fewer'} prompt tokens per query")
+
+if __name__ == "__main__":
+    main()
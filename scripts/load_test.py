@@ -0,0 +1,319 @@
+"""End-to-end load test against a locally started server.
+
+Starts the local OpenAI stub and the application (gunicorn with
+gunicorn_config.py by default) in a scratch directory, seeds a document, then
+drives a weighted mix of /upload, /save_pdf, /history, /index_document and /chat
+from concurrent clients. Reports throughput, p50/p95/p99 latency and error rate
+per route. Runs fully offline.
+
+Throughput counts requests completed within --duration; the time spent
+waiting for requests still in flight at the end is reported as drain time.
+Uploads reuse the PDF's file name by default, as independent users uploading
+"paper.pdf" would, so same-name collisions on the server show up as errors;
+pass --upload-names unique to give every upload its own name.
+
+Usage:
+    python scripts/load_test.py --duration 60 --concurrency 16
+    python scripts/load_test.py --workers 2 --threads 8 --mix history=4,chat=4,upload=1
+    python scripts/load_test.py --server flask --json results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_openai_server import start_server
+
+API_KEY = "sk-load-test"
+DEFAULT_MIX = "upload=1,save_pdf=1,history=4,index_document=0.2,chat=4"
+DEFAULT_PDF = os.path.join(REPO_ROOT, "storage", "2501.00663v1.pdf")
+
+def free_port() -> int:
+    """Ask the OS for an unused local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_mix(mix: str):
+    """Parse "route=weight,..." into a list of (route, weight)."""
+    weights = []
+    for item in mix.split(","):
+        route, _, weight = item.partition("=")
+        weights.append((route.strip(), float(weight or 1)))
+    return weights
+
+def multipart_body(filename: str, data: bytes):
+    """Encode a single file field as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def percentile(values, pct):
+    """Percentile with linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class AppServer:
+    """Run the application in a subprocess inside a scratch working directory."""
+
+    def __init__(self, args, openai_base_url: str):
+        self.args = args
+        self.port = free_port()
+        self.workdir = tempfile.mkdtemp(prefix="pdfx-load-")
+        self.env = dict(
+            os.environ,
+            PYTHONPATH=REPO_ROOT,
+            OPENAI_BASE_URL=openai_base_url,
+            INDEX_CACHE_DIR=os.path.join(self.workdir, "index_cache"),
+            PYTHONUNBUFFERED="1"
+        )
+        self.process = None
+
+    def command(self):
+        if self.args.server == "flask":
+            return [sys.executable, "-c", (
+                "import logging, app; logging.disable(logging.INFO); "
+                f"app.app.run(host='127.0.0.1', port={self.port}, threaded=True)"
+            )]
+        command = [
+            sys.executable, "-m", "gunicorn",
+            "-c", os.path.join(REPO_ROOT, self.args.config),
+            "--bind", f"127.0.0.1:{self.port}",
+            "--log-level", "warning",
+        ]
+        if self.args.workers:
+            command += ["--workers", str(self.args.workers)]
+        if self.args.threads:
+            command += ["--threads", str(self.args.threads)]
+        return command + ["app:app"]
+
+    def start(self):
+        log = open(os.path.join(self.workdir, "server.log"), "w")
+        self.process = subprocess.Popen(
+            self.command(), cwd=self.workdir, env=self.env, stdout=log, stderr=subprocess.STDOUT
+        )
+        deadline = time.time() + self.args.startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited early; see {log.name}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=2)
+                conn.request("GET", "/")
+                conn.getresponse().read()
+                conn.close()
+                return time.time() - (deadline - self.args.startup_timeout)
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("Server did not start in time")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if not self.args.keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+class LoadClient:
+    """One simulated user with its own keep-alive connection."""
+
+    def __init__(self, port: int, pdf_name: str, pdf_bytes: bytes, doc_ids, timeout: float,
+                 unique_names: bool = False):
+        self.port = port
+        self.timeout = timeout
+        self.pdf_name = pdf_name
+        self.pdf_bytes = pdf_bytes
+        self.doc_ids = doc_ids
+        self.unique_names = unique_names
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request, reconnecting once if the connection was dropped."""
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def upload_body(self):
+        # The server stores uploads by file name, so shared names exercise collisions
+        name = f"{uuid.uuid4().hex[:8]}-{self.pdf_name}" if self.unique_names else self.pdf_name
+        return multipart_body(name, self.pdf_bytes)
+
+    def run_route(self, route: str):
+        if route == "upload":
+            body, content_type = self.upload_body()
+            return self.request("POST", "/upload", body, {"Content-Type": content_type, "Accept-Encoding": "gzip"})
+        if route == "save_pdf":
+            body, content_type = self.upload_body()
+            status, data = self.request("POST", "/save_pdf", body, {"Content-Type": content_type})
+            if status == 200:
+                self.doc_ids.append(json.loads(data)["id"])
+            return status, data
+        if route == "history":
+            return self.request("GET", "/history", headers={"Accept-Encoding": "gzip"})
+        if route == "index_document":
+            doc_id = random.choice(self.doc_ids)
+            return self.request("POST", f"/index_document/{doc_id}", headers={"X-API-KEY": API_KEY})
+        if route == "chat":
+            payload = {"message": "What are the main findings of this document?"}
+            if random.random() < 0.5:
+                payload["doc_id"] = self.doc_ids[0]
+            return self.request("POST", "/chat", json.dumps(payload), {
+                "Content-Type": "application/json", "X-API-KEY": API_KEY
+            })
+        raise ValueError(f"Unknown route: {route}")
+
+def run_load(args, port: int, doc_ids, pdf_bytes: bytes):
+    """Drive the route mix from concurrent clients and collect per-route samples.
+
+    Returns the samples and the drain time: how long requests still in flight
+    when the duration ended took to finish.
+    """
+    routes, weights = zip(*parse_mix(args.mix))
+    samples = defaultdict(list)  # route -> [(latency_s, ok, completed_in_window)]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        client = LoadClient(port, os.path.basename(args.pdf), pdf_bytes, doc_ids, args.request_timeout,
+                            unique_names=args.upload_names == "unique")
+        while time.perf_counter() < stop_at:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, _ = client.run_route(route)
+                ok = 200 <= status < 400
+            except Exception:
+                ok = False
+                client.conn = None
+            end = time.perf_counter()
+            with lock:
+                samples[route].append((end - start, ok, end <= stop_at))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, max(0.0, time.perf_counter() - stop_at)
+
+def summarize(samples, duration: float):
+    """Per-route and overall throughput, latency percentiles and error rate."""
+    report = {}
+    everything = []
+    for route, values in sorted(samples.items()):
+        everything.extend(values)
+        report[route] = summarize_values(values, duration)
+    report["ALL"] = summarize_values(everything, duration)
+    return report
+
+def summarize_values(values, duration: float):
+    """Throughput, latency percentiles and error rate for one set of samples.
+
+    Throughput only counts requests that completed within the load duration;
+    latencies and errors cover every request, including those drained after it.
+    """
+    latencies = [latency * 1000 for latency, _, _ in values]
+    errors = sum(1 for _, ok, _ in values if not ok)
+    completed = sum(1 for _, _, in_window in values if in_window)
+    return {
+        "requests": len(values),
+        "rps": completed / duration if duration else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "error_rate": errors / len(values) if values else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test.")
+    parser.add_argument("--server", choices=["gunicorn", "flask"], default="gunicorn")
+    parser.add_argument("--config", default="gunicorn_config.py", help="Gunicorn config, relative to the repo")
+    parser.add_argument("--workers", type=int, help="Override the configured worker count")
+    parser.add_argument("--threads", type=int, help="Override the configured thread count")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Route weights, e.g. history=4,chat=2")
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="PDF used for uploads")
+    parser.add_argument("--upload-names", choices=["shared", "unique"], default="shared",
+                        help="Upload every file under the PDF's own name, or give each upload a unique name")
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0, help="Simulated OpenAI latency")
+    parser.add_argument("--request-timeout", type=float, default=180.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the server's scratch directory")
+    args = parser.parse_args()
+
+    stub = start_server(latency_ms=args.llm_latency_ms)
+    server = AppServer(args, f"http://127.0.0.1:{stub.server_address[1]}/v1")
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    try:
+        startup = server.start()
+        print(f"Server ready in {startup:.1f}s on port {server.port} ({server.workdir})")
+
+        # Seed one saved and indexed document for /chat and /index_document
+        seed = LoadClient(server.port, os.path.basename(args.pdf), pdf_bytes, [], args.request_timeout,
+                          unique_names=True)
+        status, data = seed.run_route("save_pdf")
+        if status != 200:
+            raise RuntimeError(f"Seeding /save_pdf failed with {status}: {data[:200]!r}")
+        status, data = seed.run_route("index_document")
+        if status != 200:
+            raise RuntimeError(f"Seeding /index_document failed with {status}: {data[:200]!r}")
+
+        samples, drain = run_load(args, server.port, seed.doc_ids, pdf_bytes)
+    finally:
+        server.stop()
+        stub.shutdown()
+
+    report = summarize(samples, args.duration)
+    print(f"\n{args.duration:.1f}s + {drain:.1f}s drain, {args.concurrency} clients, server={args.server}"
+          f" workers={args.workers or 'config'} threads={args.threads or 'config'} uploads={args.upload_names}")
+    print(f"{'route':<16} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for route, r in report.items():
+        print(f"{route:<16} {r['requests']:>9} {r['rps']:>8.2f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['error_rate']:>7.1%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "duration_s": args.duration, "drain_s": drain, "routes": report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Local stand-in for the OpenAI API, for tests, benchmarks and load tests.
+
+Implements the endpoints the application uses:
+    POST /v1/chat/completions  echoes the last user message
+    POST /v1/embeddings        deterministic hash-based vectors
+    GET  /v1/models
+
+Point the application at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+The API key "sk-invalid" is rejected with 401 so error paths can be exercised.
+
+Usage:
+    python scripts/stub_openai_server.py --port 8900 --latency-ms 200
+"""
+import argparse
+import hashlib
+import json
+import math
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 256
+INVALID_API_KEY = "sk-invalid"
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS):
+    """Build a unit vector from word hashes so similar texts get similar vectors."""
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        digest = hashlib.sha256(word.encode("utf-8")).digest()
+        index, = struct.unpack_from(">I", digest)
+        vector[index % dimensions] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency = 0.0
+    stats = {"requests": 0, "prompt_tokens": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization", "") == f"Bearer {INVALID_API_KEY}":
+            self._send_json(401, {"error": {
+                "message": "Incorrect API key provided.",
+                "type": "invalid_request_error",
+                "code": "invalid_api_key"
+            }})
+            return False
+        return True
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            if self._authorized():
+                self._send_json(200, {"object": "list", "data": [
+                    {"id": "gpt-3.5-turbo", "object": "model", "owned_by": "stub"},
+                    {"id": "text-embedding-ada-002", "object": "model", "owned_by": "stub"},
+                ]})
+        elif self.path == "/stats":
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        payload = self._read_json()
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(payload)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(payload)
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def _chat_completion(self, payload: dict):
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        answer = f"Stub answer to: {str(question)[-200:]}"
+        prompt_tokens = count_tokens(prompt)
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": count_tokens(answer),
+                "total_tokens": prompt_tokens + count_tokens(answer)
+            }
+        })
+
+    def _embeddings(self, payload: dict):
+        inputs = payload.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        with self.stats_lock:
+            self.stats["requests"] += 1
+        self._send_json(200, {
+            "object": "list",
+            "model": payload.get("model", "text-embedding-ada-002"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(str(text))}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {
+                "prompt_tokens": sum(count_tokens(str(t)) for t in inputs),
+                "total_tokens": sum(count_tokens(str(t)) for t in inputs)
+            }
+        })
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub in a background thread. Use port 0 to pick a free port."""
+    handler = type("Handler", (StubOpenAIHandler,), {
+        "latency": latency_ms / 1000.0,
+        "stats": {"requests": 0, "prompt_tokens": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stub of the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial delay per request")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency_ms)
+    print(f"Stub OpenAI API listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
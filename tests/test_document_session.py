@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import fitz
+
+from Libraries.document_session import DocumentSessionCache
+
+def make_pdf(path, text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+def test_evicted_session_stays_open_until_released(tmp_path):
+    cache = DocumentSessionCache(max_documents=1)
+    first = make_pdf(tmp_path / "first.pdf", "first")
+    second = make_pdf(tmp_path / "second.pdf", "second")
+
+    with cache.open(first) as first_doc:
+        with cache.open(second):
+            pass
+        # Evicted by the second document, but still in use here
+        assert not first_doc.is_closed
+        assert len(first_doc) == 1
+    assert first_doc.is_closed
+
+    with cache.open(second) as second_doc:
+        assert not second_doc.is_closed
+
+def test_discard_while_in_use_closes_after_release(tmp_path):
+    cache = DocumentSessionCache()
+    path = make_pdf(tmp_path / "upload.pdf", "upload")
+
+    with cache.open(path) as doc:
+        cache.discard(path)
+        assert not doc.is_closed
+        assert not cache._sessions
+    assert doc.is_closed
+
+    with cache.open(path) as reopened:
+        assert reopened is not doc
+        assert not reopened.is_closed
+
+def test_discard_idle_session_closes_it(tmp_path):
+    cache = DocumentSessionCache()
+    path = make_pdf(tmp_path / "upload.pdf", "upload")
+
+    with cache.open(path) as doc:
+        pass
+    cache.discard(path)
+
+    assert doc.is_closed
+    assert not cache._sessions and not cache._hashes
+    cache.discard(str(tmp_path / "missing.pdf"))
+
+def test_rename_reuses_session_and_rewrite_rehashes(tmp_path, monkeypatch):
+    cache = DocumentSessionCache()
+    path = make_pdf(tmp_path / "upload.pdf", "original")
+    with cache.open(path) as doc:
+        pass
+
+    # A rename keeps the file identity, so neither hashing nor parsing repeats
+    moved = str(tmp_path / "stored.pdf")
+    os.replace(path, moved)
+    hashes = []
+    real_sha256 = hashlib.sha256
+
+    def counting_sha256(data):
+        hashes.append(data)
+        return real_sha256(data)
+
+    monkeypatch.setattr(hashlib, "sha256", counting_sha256)
+    with cache.open(moved) as moved_doc:
+        assert moved_doc is doc
+    assert hashes == []
+
+    # New contents at the same path are hashed and parsed again
+    make_pdf(moved, "rewritten")
+    with cache.open(moved) as rewritten_doc:
+        assert rewritten_doc is not doc
+        assert "rewritten" in rewritten_doc[0].get_text()
+    assert len(hashes) == 1
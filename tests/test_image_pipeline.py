@@ -0,0 +1,50 @@
+import io
+import random
+
+from PIL import Image
+
+from Libraries.image_pipeline import ImagePipeline
+
+def noisy_png(seed, size=200):
+    rng = random.Random(seed)
+    img = Image.new("RGB", (size, size))
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(size * size)])
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def raw_image(xref, page, data):
+    return {"page": page, "xref": xref, "image": data, "ext": "png", "width": 200, "height": 200}
+
+class CountingPipeline(ImagePipeline):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.encoded = []
+
+    def _process_one(self, raw):
+        self.encoded.append(raw["xref"])
+        return super()._process_one(raw)
+
+def test_repeated_xrefs_are_encoded_once():
+    pipeline = CountingPipeline(max_workers=2)
+    raws = [raw_image(5, 1, noisy_png(1)), {"page": 2, "xref": 5}, {"page": 3, "xref": 5}]
+
+    outputs = pipeline.process(raws)
+
+    assert pipeline.encoded == [5]
+    assert all(output and output["xref"] == 5 for output in outputs)
+    assert outputs[0]["data"] == outputs[2]["data"]
+
+def test_encoding_stops_once_budget_is_spent():
+    probe = ImagePipeline().process([raw_image(1, 1, noisy_png(1))])[0]
+    cost = len(probe["data"]) - len("data:image/jpeg;base64,")
+    pipeline = CountingPipeline(max_workers=1, byte_budget=cost * 2 + cost // 2)
+    raws = [raw_image(xref, xref, noisy_png(xref)) for xref in range(1, 41)]
+
+    outputs = pipeline.process(raws)
+
+    kept = [output for output in outputs if output]
+    assert 1 <= len(kept) <= 3
+    assert all(output is None for output in outputs[len(kept):])
+    # Only a small look-ahead window beyond the budget is ever encoded
+    assert len(pipeline.encoded) <= len(kept) + 1 + pipeline.max_workers * 2
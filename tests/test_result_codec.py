@@ -0,0 +1,81 @@
+import base64
+import json
+import struct
+import zlib
+
+from Libraries.db_manager import NaNEncoder
+from Libraries.result_codec import ResultCodec
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+def sample_result():
+    data_uri = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode("ascii")
+    return {
+        "success": True,
+        "total_pages": 2,
+        "metadata": {"title": "Sample", "author": "Ünïcode"},
+        "content": [
+            {
+                "page": 1,
+                "content": "First page text",
+                "tables": [],
+                "images": [{
+                    "data": data_uri,
+                    "type": "png",
+                    "width": 32,
+                    "height": 32,
+                    "original": {"data": data_uri, "type": "png", "width": 64, "height": 64},
+                }],
+            },
+            {"page": 2, "content": "Second page", "tables": [{"rows": [[1, None]]}], "images": []},
+        ],
+    }
+
+def expected(result):
+    return json.loads(json.dumps(result))
+
+def test_binary_round_trip():
+    result = sample_result()
+    blob = ResultCodec.encode(result, json_encoder=NaNEncoder)
+
+    assert ResultCodec.is_encoded(blob)
+    stored = ResultCodec.decode(blob)
+    assert stored["total_pages"] == 2
+    assert len(stored["content"]) == 2
+    assert stored.get_page(1)["content"] == "Second page"
+    assert stored.to_dict() == expected(result)
+
+def test_binary_stores_images_uncompressed_outside_pages():
+    blob = ResultCodec.encode(sample_result())
+
+    assert PNG_BYTES in blob
+    assert base64.b64encode(PNG_BYTES) not in blob
+
+def test_legacy_json_round_trip():
+    result = sample_result()
+    legacy = json.dumps(result, cls=NaNEncoder)
+
+    assert not ResultCodec.is_encoded(legacy)
+    for stored_value in (legacy, legacy.encode("utf-8")):
+        stored = ResultCodec.decode(stored_value)
+        assert stored.get_page(0)["images"][0]["data"] == result["content"][0]["images"][0]["data"]
+        decoded = stored.to_dict()
+        assert decoded["metadata"] == result["metadata"]
+        assert decoded == expected(result)
+
+def test_version_1_remains_readable():
+    result = expected(sample_result())
+    body = bytearray()
+    pages = []
+    for page in result["content"]:
+        blob = zlib.compress(json.dumps(page).encode("utf-8"))
+        pages.append([len(body), len(blob)])
+        body.extend(blob)
+    fields = {key: value for key, value in result.items() if key != "content"}
+    header = zlib.compress(json.dumps({"fields": fields, "pages": pages}).encode("utf-8"))
+    data = ResultCodec.MAGIC + struct.pack(">BI", 1, len(header)) + header + bytes(body)
+
+    assert ResultCodec.decode(data).to_dict() == result
+
+def test_empty_data():
+    assert ResultCodec.decode(None).to_dict() == {}